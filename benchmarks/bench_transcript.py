@@ -0,0 +1,127 @@
+"""
+Transcript pipeline throughput on synthetic multi-hour lectures.
+
+    python -m benchmarks.bench_transcript --hours 10 --videos 16
+
+Fixtures are generated deterministically (or loaded from --fixture, a JSON
+list of {text, start, duration} segments), so no network is needed.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from benchmarks.fixtures import synthetic_segments
+from src import transcript_batch
+from src.catalog import Catalog
+from src.transcript import YTTranscriptText, iter_paragraphs
+from src.transcript_batch import download_transcripts, format_transcript
+from src.transcript_search import TranscriptIndex
+
+
+def legacy_paragraphs(lines, min_length=400):
+    # The string-concatenation version this replaced, kept for comparison.
+    paragraphs = []
+    current = ''
+    count = 0
+    for line in lines:
+        if current:
+            current += ' '
+        current += line
+        count += len(line) + 1
+        if line.strip().endswith(('.', '?', '!')) and count >= min_length:
+            paragraphs.append(current.strip())
+            current = ''
+            count = 0
+    if current:
+        paragraphs.append(current.strip())
+    return paragraphs
+
+
+def timed(fn, *args, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def simulated_batch(segments, videos, latency, fetch_workers, out_dir):
+    # Runs download_transcripts with fetches replaced by a sleep of `latency`
+    # seconds, which is what dominates real batch runs.
+    catalog = Catalog(os.path.join(out_dir, "catalog.sqlite3"))
+    index = TranscriptIndex(os.path.join(out_dir, "search.sqlite3"))
+
+    def fake_fetch(url, dir):
+        time.sleep(latency)
+        yt = YTTranscriptText(url, dir, catalog=catalog, search_index=index)
+        yt.video_id, yt.title, yt.description = url, f"Lecture {url}", ""
+        yt.transcript = segments
+        return yt
+
+    real_fetch = transcript_batch.fetch_transcript
+    transcript_batch.fetch_transcript = fake_fetch
+    try:
+        start = time.perf_counter()
+        results = download_transcripts([f"v{i}" for i in range(videos)], out_dir,
+                                       fetch_workers=fetch_workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        transcript_batch.fetch_transcript = real_fetch
+    errors = [r for r in results.values() if isinstance(r, Exception)]
+    if errors:
+        raise errors[0]
+    return elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--hours", type=float, default=10)
+    parser.add_argument("--videos", type=int, default=8, help="transcripts in the batch run")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--fixture", help="JSON file with transcript segments")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated fetch seconds per video")
+    args = parser.parse_args(argv)
+
+    if args.fixture:
+        with open(args.fixture, "r", encoding="utf-8") as f:
+            segments = json.load(f)
+    else:
+        segments = synthetic_segments(args.hours)
+    lines = [s['text'] for s in segments]
+    chars = sum(len(line) for line in lines)
+
+    legacy_s, legacy = timed(legacy_paragraphs, lines)
+    stream_s, streamed = timed(lambda: list(iter_paragraphs(segments)))
+    assert legacy == [p['text'] for p in streamed]
+    print(f"segments: {len(segments)}  chars: {chars}")
+    print(f"legacy list_to_paragraphs: {legacy_s * 1000:8.1f} ms  ({chars / legacy_s / 1e6:.1f} MB/s)")
+    print(f"iter_paragraphs:           {stream_s * 1000:8.1f} ms  ({chars / stream_s / 1e6:.1f} MB/s)")
+
+    jobs = [(f"id{i:09d}", f"Lecture {i}", "", segments) for i in range(args.videos)]
+    start = time.perf_counter()
+    for job in jobs:
+        format_transcript(*job)
+    serial_s = time.perf_counter() - start
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        list(pool.map(format_transcript, *zip(*jobs[:1])))  # warm up workers
+        start = time.perf_counter()
+        list(pool.map(format_transcript, *zip(*jobs)))
+        pool_s = time.perf_counter() - start
+    hours = len(jobs) * segments[-1]['start'] / 3600
+    print(f"format {len(jobs)} transcripts serial:       {serial_s:6.2f} s  ({hours / serial_s:8.0f} h of video/s)")
+    print(f"format {len(jobs)} transcripts {args.workers} processes: {pool_s:6.2f} s  ({hours / pool_s:8.0f} h of video/s)")
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        sequential_s = simulated_batch(segments, args.videos, args.latency, 1, out_dir)
+        batch_s = simulated_batch(segments, args.videos, args.latency, 8, out_dir)
+    print(f"end-to-end {args.videos} videos, {args.latency}s fetch latency: "
+          f"sequential {sequential_s:.2f} s, batch {batch_s:.2f} s ({sequential_s / batch_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Offline stand-ins for YouTube: synthetic or recorded `extract_info` results,
+caption segments and media files, all generated deterministically.
+"""
+import json
+import os
+import random
+import time
+
+from src.media_server import MediaServer, _MediaHandler
+
+WORDS = ("the of and to in is that for it as was with be by on not he this are or "
+         "his from at which but have an they you were her she there been one all "
+         "we their has would when if so what no out up into about than them can "
+         "only other new some time could these two may then do first any my now "
+         "such like our over man me even most made after also did many before must "
+         "through back years where much your way well down should because each").split()
+
+HEIGHTS = (144, 240, 360, 480, 720, 1080, 1440, 2160, 4320)
+VIDEO_CODECS = (("avc1.64001F", "mp4"), ("vp09.00.40.08", "webm"), ("av01.0.08M.08", "mp4"))
+AUDIO_CODECS = (("mp4a.40.2", "m4a"), ("opus", "webm"))
+AUDIO_ABRS = (32, 35, 48, 50, 64, 70, 96, 128, 130, 160)
+
+
+def synthetic_info(n_formats=300, duration=3600, seed=0, video_id="bench0000001"):
+    """
+    An info dict shaped like yt-dlp's YouTube output with `n_formats`
+    formats: mostly video-only (many per height, as with multiple codecs,
+    fps and DRC/language variants), plus audio-only and a few muxed ones.
+    """
+    rng = random.Random(seed)
+    formats = []
+    for i in range(n_formats):
+        kind = rng.random()
+        fmt = {'format_id': str(1000 + i), 'protocol': 'https',
+               'url': f"https://example.invalid/{video_id}/{i}"}
+        if kind < 0.7:
+            height = rng.choice(HEIGHTS)
+            vcodec, ext = rng.choice(VIDEO_CODECS)
+            vbr = height * rng.uniform(2.0, 6.0)
+            fmt.update(vcodec=vcodec, acodec='none', ext=ext, height=height,
+                       width=height * 16 // 9, fps=rng.choice((24, 30, 60)), vbr=vbr, tbr=vbr)
+        elif kind < 0.95:
+            acodec, ext = rng.choice(AUDIO_CODECS)
+            abr = rng.choice(AUDIO_ABRS) + rng.uniform(-2, 2)
+            fmt.update(vcodec='none', acodec=acodec, ext=ext, abr=abr, tbr=abr,
+                       asr=rng.choice((44100, 48000)))
+        else:
+            height = rng.choice((360, 720))
+            fmt.update(vcodec='avc1.42001E', acodec='mp4a.40.2', ext='mp4', height=height,
+                       width=height * 16 // 9, tbr=height * 2.5)
+        size = int(fmt['tbr'] * 1000 / 8 * duration)
+        if rng.random() < 0.8:
+            fmt['filesize'] = size
+        else:
+            fmt['filesize_approx'] = size
+        formats.append(fmt)
+    return {
+        'id': video_id,
+        'title': f"Benchmark video {video_id}",
+        'description': "Synthetic fixture.\nSecond line.",
+        'duration': duration,
+        'webpage_url': f"https://www.youtube.com/watch?v={video_id}",
+        'formats': formats,
+    }
+
+
+def synthetic_segments(hours, seed=0, seconds_per_segment=3.0):
+    """Caption segments for a lecture `hours` long, ~25% ending a sentence."""
+    rng = random.Random(seed)
+    segments = []
+    t = 0.0
+    while t < hours * 3600:
+        text = ' '.join(rng.choices(WORDS, k=rng.randint(5, 12)))
+        if rng.random() < 0.25:
+            text += rng.choice('.?!')
+        segments.append({'text': text, 'start': round(t, 2), 'duration': seconds_per_segment})
+        t += seconds_per_segment
+    return segments
+
+
+def make_sparse_file(path, size):
+    """A `size` byte file that costs no disk space or time to create."""
+    with open(path, "wb") as f:
+        f.truncate(size)
+    return path
+
+
+class _ThrottledHandler(_MediaHandler):
+    def _copy(self, f, offset, length):
+        rate = self.server.rate
+        chunk = max(rate // 20, 16 * 1024)
+        f.seek(offset)
+        try:
+            while length > 0:
+                data = f.read(min(length, chunk))
+                if not data:
+                    break
+                self.wfile.write(data)
+                length -= len(data)
+                time.sleep(len(data) / rate)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+
+class ThrottledMediaServer(MediaServer):
+    """MediaServer capping every connection at `rate` bytes/s, like a throttling CDN."""
+
+    def __init__(self, roots, rate, host="127.0.0.1", port=0):
+        self.rate = rate
+        super().__init__(roots, host, port)
+        self.RequestHandlerClass = _ThrottledHandler
+
+
+def load_info(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def record_info(url, path):
+    """Saves a real extract_info result for offline replay (needs network)."""
+    import yt_dlp
+    with yt_dlp.YoutubeDL({'quiet': True, 'no_warnings': True, 'skip_download': True}) as ydl:
+        info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(info, f)
+    return info
@@ -0,0 +1,368 @@
+"""
+Offline benchmark suite for the download and transcript hot paths.
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --stream-mb 4096 --compare results.json
+
+Nothing touches YouTube: format lists come from synthetic (or --info
+recorded) extract_info fixtures, streams are sparse files served by a local
+range-capable HTTP server, and captions are generated. Results are written as
+JSON; with --compare the run fails if any benchmark got slower than the
+baseline by more than --threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from benchmarks.fixtures import (ThrottledMediaServer, load_info, make_sparse_file,
+                                 synthetic_info, synthetic_segments)
+from src.audio_video import AudioVideoDownloader
+from src.catalog import Catalog
+from src.format_planner import FormatPlanner
+from src.media_server import MediaServer
+from src.segmented import SegmentedDownload
+from src.sync import SyncArchive, plan_sync
+from src.transcript import YTTranscriptText
+from src.transcript_search import TranscriptIndex
+from src.transcript_store import TranscriptCues, export, write_cues
+from src.ydl_pool import YDLPool
+
+# What `streamlit run streamlit.py` imports before its first paint
+UI_MODULES = ["src.metadata_cache", "src.video_info", "src.show_downloads", "src.show_search",
+              "src.show_jobs", "src.media_server", "src.metrics", "src.job_queue",
+              "src.job_service", "src.audio_video"]
+YDL_OPTS = {'quiet': True, 'no_warnings': True, 'skip_download': True}
+
+
+def measure(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def result(name, times, params, work=None, unit=None):
+    best = min(times)
+    entry = {
+        'name': name,
+        'best_s': best,
+        'mean_s': statistics.fmean(times),
+        'repeat': len(times),
+        'params': params,
+    }
+    if work is not None:
+        entry['throughput'] = work / best if best else None
+        entry['unit'] = unit
+    return entry
+
+
+class Bench:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.catalog = Catalog(os.path.join(workdir, "catalog.sqlite3"))
+        self.index = TranscriptIndex(os.path.join(workdir, "search.sqlite3"))
+        self.info = load_info(args.info) if args.info else synthetic_info(args.formats)
+        for d in ("video", "audio", "temp", "transcript", "media"):
+            os.makedirs(os.path.join(workdir, d), exist_ok=True)
+
+    def downloader(self, url="offline"):
+        return AudioVideoDownloader(
+            url=url,
+            video_dir=os.path.join(self.workdir, "video"),
+            audio_dir=os.path.join(self.workdir, "audio"),
+            info=self.info,
+            temp_dir=os.path.join(self.workdir, "temp"),
+            catalog=self.catalog,
+        )
+
+    def bench_get_video_audio_combinations(self):
+        d = self.downloader()
+        n = len(d.formats)
+        times = measure(d.get_video_audio_combinations, self.args.repeat * 10)
+        return result("get_video_audio_combinations", times, {'formats': n}, n, "formats/s")
+
+    def bench_get_audio_options(self):
+        d = self.downloader()
+        n = len(d.formats)
+        times = measure(d.get_audio_options, self.args.repeat * 10)
+        return result("get_audio_options", times, {'formats': n}, n, "formats/s")
+
+    def bench_plan_budget(self):
+        formats, duration = self.info.get('formats', []), self.info.get('duration')
+
+        def run():
+            planner = FormatPlanner(formats, duration)
+            planner.plans(throughput=5e6, max_seconds=120, copy_only=True, limit=5)
+            planner.plans(min_height=720, rank="size", limit=5)
+        times = measure(run, self.args.repeat * 10)
+        return result("plan_budget", times, {'formats': len(formats)}, len(formats), "formats/s")
+
+    def bench_sync_plan(self):
+        """Channel of --channel-videos uploads, 3 of them new since the last sync."""
+        n = self.args.channel_videos
+        ids = [f"v{i:010d}" for i in range(n)]  # newest first
+        archive = SyncArchive(os.path.join(self.workdir, "archive.sqlite3"))
+        for video_id in ids[3:]:
+            archive.record(video_id, "video")
+        listed = []
+
+        def channel():
+            for video_id in ids:
+                listed.append(video_id)
+                yield video_id, f"https://www.youtube.com/watch?v={video_id}"
+
+        def run():
+            listed.clear()
+            todo = plan_sync("https://www.youtube.com/@bench/videos", ["video"], archive,
+                             entries=channel())
+            assert len(todo) == 3
+        times = measure(run, self.args.repeat)
+        return result("sync_plan", times, {'videos': n, 'listed': len(listed)})
+
+    def bench_download_stream(self):
+        size = self.args.stream_mb * 1024 * 1024
+        make_sparse_file(os.path.join(self.workdir, "media", "stream.mp4"), size)
+        server = MediaServer({"media": os.path.join(self.workdir, "media")})
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        out = os.path.join(self.workdir, "temp", "stream.out.mp4")
+        try:
+            d = self.downloader(server.url_for("media", "stream.mp4"))
+
+            def run():
+                if os.path.exists(out):
+                    os.remove(out)
+                d._download_stream("mp4", out, stage="video")
+            times = measure(run, self.args.repeat)
+        finally:
+            server.shutdown()
+            server.server_close()
+            if os.path.exists(out):
+                os.remove(out)
+        return result("_download_stream", times, {'bytes': size}, size / 1024 / 1024, "MiB/s")
+
+    def _ranged(self, name, connections):
+        size = self.args.ranged_mb * 1024 * 1024
+        make_sparse_file(os.path.join(self.workdir, "media", "ranged.mp4"), size)
+        rate = self.args.conn_rate_mb * 1024 * 1024
+        server = ThrottledMediaServer({"media": os.path.join(self.workdir, "media")}, rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        out = os.path.join(self.workdir, "temp", "ranged.out.mp4")
+        try:
+            def run():
+                if os.path.exists(out):
+                    os.remove(out)
+                SegmentedDownload(server.url_for("media", "ranged.mp4"), out,
+                                  connections=connections, segment_size=size // 16 or 1).run()
+            times = measure(run, self.args.repeat)
+        finally:
+            server.shutdown()
+            server.server_close()
+            if os.path.exists(out):
+                os.remove(out)
+        return result(name, times, {'bytes': size, 'connections': connections,
+                                    'conn_rate': rate}, size / 1024 / 1024, "MiB/s")
+
+    def bench_ranged_single(self):
+        return self._ranged("ranged_single", 1)
+
+    def bench_ranged_segmented(self):
+        return self._ranged("ranged_segmented", self.args.connections)
+
+    def bench_merge_video_audio(self):
+        if not shutil.which("ffmpeg"):
+            return {'name': "_merge_video_audio", 'skipped': "ffmpeg not found"}
+        seconds = self.args.merge_seconds
+        src_v = os.path.join(self.workdir, "media", "merge.video.mp4")
+        src_a = os.path.join(self.workdir, "media", "merge.audio.m4a")
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i",
+                        f"testsrc2=size=1280x720:rate=30:duration={seconds}",
+                        "-c:v", "libx264", "-preset", "ultrafast", src_v], check=True)
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i",
+                        f"sine=frequency=440:duration={seconds}", "-c:a", "aac", src_a], check=True)
+        d = self.downloader()
+        d.info = dict(self.info, duration=seconds)
+        out = os.path.join(self.workdir, "video", "merged.mp4")
+        v_tmp = os.path.join(self.workdir, "temp", "m.video.mp4")
+        a_tmp = os.path.join(self.workdir, "temp", "m.audio.m4a")
+
+        def run():
+            # _merge_video_audio deletes its inputs, so hand it copies
+            shutil.copyfile(src_v, v_tmp)
+            shutil.copyfile(src_a, a_tmp)
+            d._merge_video_audio(v_tmp, a_tmp, out)
+        times = measure(run, self.args.repeat)
+        size = os.path.getsize(src_v) + os.path.getsize(src_a)
+        return result("_merge_video_audio", times, {'bytes': size, 'seconds': seconds},
+                      size / 1024 / 1024, "MiB/s")
+
+    def bench_ui_import(self):
+        code = "import " + ", ".join(UI_MODULES)
+        times = measure(lambda: subprocess.run([sys.executable, "-c", code], check=True),
+                        self.args.repeat)
+        bare = min(measure(lambda: subprocess.run([sys.executable, "-c", "pass"], check=True),
+                           self.args.repeat))
+        return result("ui_import", times, {'modules': len(UI_MODULES), 'interpreter_s': bare})
+
+    def bench_ydl_fresh(self):
+        import yt_dlp
+
+        times = measure(lambda: yt_dlp.YoutubeDL(dict(YDL_OPTS)).close(), self.args.repeat * 10)
+        return result("ydl_fresh", times, {})
+
+    def bench_ydl_pooled(self):
+        pool = YDLPool()
+
+        def run():
+            with pool.acquire(YDL_OPTS, format="18", outtmpl="x.mp4", progress_hook=print):
+                pass
+        run()
+        times = measure(run, self.args.repeat * 10)
+        pool.close()
+        return result("ydl_pooled", times, {})
+
+    def _transcript(self):
+        yt = YTTranscriptText("offline", os.path.join(self.workdir, "transcript"),
+                              catalog=self.catalog, search_index=self.index)
+        yt.video_id = self.info.get('id', 'bench')
+        yt.title = self.info.get('title', 'bench')
+        yt.description = self.info.get('description', '')
+        yt.transcript = synthetic_segments(self.args.hours)
+        yt.transcript_text = [s['text'] for s in yt.transcript]
+        return yt
+
+    def bench_list_to_paragraphs(self):
+        yt = self._transcript()
+        times = measure(yt.list_to_paragraphs, self.args.repeat)
+        n = len(yt.transcript)
+        return result("list_to_paragraphs", times, {'segments': n, 'hours': self.args.hours},
+                      n, "segments/s")
+
+    def bench_write_markdown(self):
+        yt = self._transcript()
+        yt.list_to_paragraphs()
+        times = measure(yt.write_markdown, self.args.repeat)
+        n = len(yt.transcript)
+        return result("write_markdown", times, {'segments': n, 'hours': self.args.hours},
+                      n, "segments/s")
+
+    def _cues(self):
+        path = os.path.join(self.workdir, "bench.cues")
+        if not os.path.exists(path):
+            write_cues(path, synthetic_segments(self.args.hours), {'video_id': 'bench'})
+        return TranscriptCues(path)
+
+    def bench_cues_range(self):
+        cues = self._cues()
+        span = self.args.hours * 3600
+        windows = [(span * k / 1000, span * k / 1000 + 60) for k in range(1000)]
+
+        def run():
+            for start, end in windows:
+                cues.text_between(start, end)
+        times = measure(run, self.args.repeat)
+        cues.close()
+        return result("cues_range", times, {'segments': len(cues), 'windows': len(windows)},
+                      len(windows), "queries/s")
+
+    def bench_cues_export_srt(self):
+        cues = self._cues()
+        path = os.path.join(self.workdir, "bench.srt")
+
+        def run():
+            with open(path, "w", encoding="utf-8") as f:
+                export(cues, "srt", f)
+        times = measure(run, self.args.repeat)
+        n = len(cues)
+        cues.close()
+        return result("cues_export_srt", times, {'segments': n, 'hours': self.args.hours},
+                      n, "segments/s")
+
+
+BENCHMARKS = [name[len("bench_"):] for name in vars(Bench) if name.startswith("bench_")]
+
+
+def compare(results, baseline_path, threshold):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {r['name']: r for r in json.load(f)['results'] if 'best_s' in r}
+    regressions = []
+    for r in results:
+        old = baseline.get(r['name'])
+        if not old or 'best_s' not in r:
+            continue
+        ratio = r['best_s'] / old['best_s'] if old['best_s'] else 1.0
+        flag = "REGRESSION" if ratio > 1 + threshold else ""
+        print(f"  {r['name']:<30} {old['best_s'] * 1000:10.2f} ms -> {r['best_s'] * 1000:10.2f} ms"
+              f"  x{ratio:5.2f} {flag}")
+        if flag:
+            regressions.append(r['name'])
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--only", nargs="*", choices=BENCHMARKS, help="run a subset")
+    parser.add_argument("--info", help="recorded extract_info JSON to replay")
+    parser.add_argument("--formats", type=int, default=300, help="synthetic format count")
+    parser.add_argument("--stream-mb", type=int, default=256, help="size of the served stream")
+    parser.add_argument("--ranged-mb", type=int, default=64, help="size of the throttled stream")
+    parser.add_argument("--conn-rate-mb", type=int, default=32, help="per-connection cap, MiB/s")
+    parser.add_argument("--connections", type=int, default=8, help="segmented download connections")
+    parser.add_argument("--channel-videos", type=int, default=5000, help="sync_plan channel size")
+    parser.add_argument("--merge-seconds", type=int, default=60, help="length of the merge fixture")
+    parser.add_argument("--hours", type=float, default=10, help="transcript length")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown ratio")
+    args = parser.parse_args(argv)
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="yt-bench-") as workdir:
+        bench = Bench(args, workdir)
+        for name in args.only or BENCHMARKS:
+            r = getattr(bench, f"bench_{name}")()
+            results.append(r)
+            if 'skipped' in r:
+                print(f"{r['name']:<30} skipped ({r['skipped']})")
+            else:
+                rate = f"  {r['throughput']:12.1f} {r['unit']}" if r.get('throughput') else ""
+                print(f"{r['name']:<30} {r['best_s'] * 1000:10.2f} ms{rate}")
+
+    report = {
+        'revision': git_revision(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'timestamp': time.time(),
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        print(f"compared with {args.compare}:")
+        if compare(results, args.compare, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
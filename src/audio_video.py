@@ -1,13 +1,24 @@
-import yt_dlp
 import os
-import ffmpeg
 import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from src.catalog import get_catalog
+from src.media_store import get_media_store
+from src.metadata_cache import extract_info
+from src.format_planner import FormatPlanner
+from src.governor import BATCH, get_governor
+from src.metrics import get_metrics, instrument
+from src.merge import is_streamable, merge_streams
+from src.segmented import RangeNotSupported, SegmentedDownload, is_segmentable
+from src.ydl_pool import get_ydl_pool
 
 class AudioVideoDownloader:
     def __init__(
         self, url, video_dir, audio_dir, info=None,
         progress_hook=None, status_callback=None,
-        audio_only=False, temp_dir="./temp"
+        audio_only=False, temp_dir="./temp", stream_merge=False,
+        catalog=None, progress_bus=None, store=None, connections=1,
+        priority=BATCH, governor=None
     ):
         """
         url: string, video URL
@@ -17,6 +28,22 @@ class AudioVideoDownloader:
         status_callback: function(stage, status), called for status messages
         audio_only: bool, if True only get/download audio
         temp_dir: temp path for combining, must exist
+        stream_merge: bool, if True feed stream URLs straight into ffmpeg
+            (no temp files) when both formats allow it
+        catalog: Catalog finished files are recorded in (default: shared one)
+        progress_bus: ProgressBus; when set, progress goes to the bus (which
+            throttles and fans it out on its own threads) instead of
+            progress_hook
+        store: MediaStore streams are fetched into and reused from
+            (default: shared one)
+        connections: HTTP connections per stream; above 1, plain http(s)
+            formats are fetched as parallel byte ranges (see src.segmented)
+        priority: governor priority of the transfers (INTERACTIVE or BATCH)
+        governor: Governor transfers take slots and bandwidth from
+            (default: shared one)
+
+        Setting `cancel_event` (a threading.Event) from any thread aborts
+        running transfers at their next chunk.
         """
         self.url = url
         self.video_dir = video_dir
@@ -25,60 +52,42 @@ class AudioVideoDownloader:
         self.status_callback = status_callback
         self.audio_only = audio_only
         self.temp_dir = temp_dir
+        self.stream_merge = stream_merge
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.progress_bus = progress_bus
+        self.store = store if store is not None else get_media_store()
+        self.connections = connections
+        self.priority = priority
+        self.governor = governor if governor is not None else get_governor()
+        self.cancel_event = threading.Event()
         self.info = info
         if not self.info:
             self.info = self.fetch_video_info()
         self.formats = self.info.get('formats', [])
         self.title = self.info.get('title', 'output').replace('/', '_').replace('\\', '_')
+        self.video_id = self.info.get('id') or self.title
+        self._planner = None
 
     def fetch_video_info(self):
-        ydl_opts = {'quiet': True, 'no_warnings': True}
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            return ydl.extract_info(self.url, download=False)
+        return extract_info(self.url)
+
+    @property
+    def planner(self):
+        """FormatPlanner over this video's formats, built on first use."""
+        if self._planner is None:
+            self._planner = FormatPlanner(self.formats, self.info.get('duration'))
+        return self._planner
 
     def get_audio_options(self):
-        auds = [f for f in self.formats if f.get('vcodec') == 'none' and f.get('acodec') != 'none']
         # Bucket audio streams to common bitrates for easy menu
-        newpipe_buckets = [32, 35, 48, 50, 70, 128, 160]
-        bucket_map = {}
-        for tier in newpipe_buckets:
-            candidates = [a for a in auds if abs((a.get('abr') or 0) - tier) <= 5]
-            if candidates:
-                best = min(candidates, key=lambda a: a.get('filesize') or a.get('filesize_approx') or float('inf'))
-                bucket_map[tier] = best
-        return [bucket_map[t] for t in sorted(bucket_map.keys()) if t in bucket_map]
+        return self.planner.audio_buckets()
 
     def get_video_audio_combinations(self):
-        # Get all video-only streams (deduplicate by height)
-        vids = [f for f in self.formats if f.get('vcodec') != 'none' and f.get('acodec') == 'none']
-        unique_vids = {}
-        for f in sorted(vids, key=lambda x: (x.get('height') or 0)):
-            h = f.get('height')
-            size = f.get('filesize') or f.get('filesize_approx')
-            if h and h not in unique_vids and size:
-                unique_vids[h] = f
-        vids = list(unique_vids.values())
-        auds = self.get_audio_options()
-        # Pair each video stream with the closest-quality audio
-        def best_audio_for_video(h):
-            target_abr = 48 + (h / 1080) * (160 - 48)
-            closest = min(auds, key=lambda a: abs((a.get('abr') or 0) - target_abr), default=None)
-            return closest
-        combinations = []
-        for v in vids:
-            a = best_audio_for_video(v.get('height') or 0)
-            v_size = v.get('filesize') or v.get('filesize_approx') or 0
-            a_size = (a.get('filesize') or a.get('filesize_approx') or 0) if a else 0
-            combinations.append({
-                'video': v,
-                'audio': a,
-                'height': v.get('height'),
-                'abr': a.get('abr') if a else None,
-                'ext_video': v.get('ext'),
-                'ext_audio': a.get('ext') if a else None,
-                'size': v_size + a_size
-            })
-        return combinations
+        """
+        Best plan per height (see FormatPlanner): each video is paired with
+        the best audio that stream-copies into its container, or into mkv.
+        """
+        return self.planner.per_height(throughput=get_metrics().throughput())
 
     def download_audio(self, option):
         """
@@ -89,8 +98,13 @@ class AudioVideoDownloader:
         ext = option['ext']
         output_path = os.path.join(self.audio_dir, f"{self.title}.{ext}")
         self._call_status("audio", "downloading")
-        self._download_stream(a_fmt, output_path, stage="audio")
+        with self.store.hold(self.store.path_for(self.video_id, a_fmt, ext)):
+            stored = self.store.fetch(
+                self.video_id, a_fmt, ext,
+                lambda path: self._download_stream(a_fmt, path, stage="audio"))
+            self.store.link_into(stored, output_path)
         self._call_status("audio", "completed")
+        self._record(output_path, "audio", a_fmt)
         return output_path
 
     def download_video_with_audio(self, combination_option):
@@ -102,29 +116,129 @@ class AudioVideoDownloader:
         a_fmt = combination_option['audio']['format_id']
         ext_v = combination_option['ext_video']
         ext_a = combination_option['ext_audio']
-        video_temp_path = os.path.join(self.temp_dir, f"{self.title}.video.{ext_v}")
-        audio_temp_path = os.path.join(self.temp_dir, f"{self.title}.audio.{ext_a}")
+        # Planner combos name the container the pair stream-copies into
+        container = combination_option.get('container') or ext_v
         output_path = os.path.join(
             self.video_dir,
-            f"{self.title}.{ext_v}")
-        self._call_status("video", "downloading")
-        self._download_stream(v_fmt, video_temp_path, stage="video")
-        self._call_status("video", "completed")
-        self._call_status("audio", "downloading")
-        self._download_stream(a_fmt, audio_temp_path, stage="audio")
-        self._call_status("audio", "completed")
-        self._call_status("merge", "merging")
-        self._merge_video_audio(video_temp_path, audio_temp_path, output_path)
+            f"{self.title}.{container}")
+        video_fmt, audio_fmt = combination_option['video'], combination_option['audio']
+        existing = self.catalog.get(output_path)
+        if existing and existing['format'] == f"{v_fmt}+{a_fmt}" and os.path.exists(output_path):
+            # Same title in the same formats is already on disk
+            self._call_status("merge", "completed")
+            return output_path
+        if self.stream_merge and is_streamable(video_fmt) and is_streamable(audio_fmt):
+            self._call_status("merge", "merging")
+            self._stream_merge(video_fmt, audio_fmt, output_path)
+            self._call_status("merge", "completed")
+            self._record(output_path, "video", f"{v_fmt}+{a_fmt}")
+            return output_path
+        # Held until merged, so quota eviction for another job cannot take them
+        with self.store.hold(self.store.path_for(self.video_id, v_fmt, ext_v),
+                             self.store.path_for(self.video_id, a_fmt, ext_a)):
+            video_path, audio_path = self._download_parallel([
+                (v_fmt, ext_v, "video"),
+                (a_fmt, ext_a, "audio"),
+            ])
+            self._call_status("merge", "merging")
+            # The streams stay in the store for later audio/video jobs; the
+            # store quota (see StorageManager) evicts them oldest first
+            self._merge_video_audio(video_path, audio_path, output_path, cleanup=False)
         self._call_status("merge", "completed")
+        self._record(output_path, "video", f"{v_fmt}+{a_fmt}")
         return output_path
 
-    def _download_stream(self, format_id, output_path, stage):
+    def _download_parallel(self, jobs):
+        """
+        jobs: list of (format_id, ext, stage)
+        Fetches all streams at once through the store (hits return at once)
+        and returns their stored paths in job order. Callbacks are queued by
+        the workers and delivered on the calling thread (Streamlit widgets can
+        only be touched from the script thread); progress published to a
+        progress_bus skips the queue. If one stream fails the others are
+        cancelled and the first error re-raised; partial files stay in the
+        store so the next attempt resumes them.
+        """
+        events = queue.Queue()
+        cancel = threading.Event()
+
+        if self.progress_bus is not None:
+            report = self._call_progress
+        else:
+            report = lambda stg, stats: events.put((self._call_progress, stg, stats))
+
+        def fetch(format_id, ext, stage):
+            events.put((self._call_status, stage, "downloading"))
+            path = self.store.fetch(
+                self.video_id, format_id, ext,
+                lambda target: self._download_stream(
+                    format_id, target, stage, report=report, cancel_event=cancel))
+            events.put((self._call_status, stage, "completed"))
+            return path
+
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            futures = [pool.submit(fetch, *job) for job in jobs]
+            while True:
+                if self.cancel_event.is_set() or any(f.done() and f.exception() for f in futures):
+                    cancel.set()
+                try:
+                    callback, stage, payload = events.get(timeout=0.1)
+                except queue.Empty:
+                    if all(f.done() for f in futures) and events.empty():
+                        break
+                    continue
+                callback(stage, payload)
+        errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            from yt_dlp.utils import DownloadCancelled
+
+            real = [e for e in errors if not isinstance(e, DownloadCancelled)]
+            raise (real or errors)[0]
+        return [f.result() for f in futures]
+
+    @instrument(lambda args: args['stage'], output=lambda args, result: args['output_path'])
+    def _download_stream(self, format_id, output_path, stage, report=None, cancel_event=None):
+        """
+        Safe to run concurrently: every call checks out its own pooled
+        YoutubeDL instance and has its own hook closure. report(stage, stats)
+        defaults to progress_hook; setting cancel_event (default:
+        self.cancel_event) aborts the transfer at the next chunk. The
+        transfer holds a governor slot and is charged to its bandwidth.
+        """
+        report = report or self._call_progress
+        cancel_event = cancel_event or self.cancel_event
+        fmt = next((f for f in self.formats if f.get('format_id') == format_id), None)
+        if self.connections > 1 and fmt is not None and is_segmentable(fmt):
+            try:
+                SegmentedDownload(
+                    fmt['url'], output_path, connections=self.connections,
+                    headers=fmt.get('http_headers'), cancel_event=cancel_event,
+                    report=lambda stats: report(stage, stats),
+                    governor=self.governor, priority=self.priority,
+                ).run()
+                return
+            except RangeNotSupported:
+                pass  # server ignores ranges: one connection through yt-dlp
+
+        # None until the first callback: a resumed .part reports its earlier
+        # bytes as downloaded, and those must not be charged again
+        charged = [None]
+
         def ytdlp_hook(d):
+            if cancel_event is not None and cancel_event.is_set():
+                from yt_dlp.utils import DownloadCancelled
+
+                raise DownloadCancelled(f"{stage} download cancelled")
             if d['status'] in ('downloading', 'finished'):
                 total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
                 downloaded = d.get('downloaded_bytes') or 0
+                if charged[0] is None:
+                    charged[0] = downloaded
+                # Sleeping here holds yt-dlp's read loop: the shared bandwidth cap
+                self.governor.throttle(downloaded - charged[0])
+                charged[0] = max(charged[0], downloaded)
                 speed = d.get('speed') or 0
-                self._call_progress(stage, {
+                report(stage, {
                     'downloaded': downloaded,
                     'total': total,
                     'speed': speed,
@@ -132,58 +246,68 @@ class AudioVideoDownloader:
                     'status': d['status'],
                 })
         ydl_opts = {
-            'format': format_id,
-            'outtmpl': output_path,
-            'progress_hooks': [ytdlp_hook],
             'quiet': True,
+            'noprogress': True,
             'noplaylist': True,
         }
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        with self.governor.slot(self.priority), get_ydl_pool().acquire(
+                ydl_opts, format=format_id, outtmpl=output_path, progress_hook=ytdlp_hook) as ydl:
             ydl.download([self.url])
 
-    def _merge_video_audio(self, video_path, audio_path, output_path):
-        # Simulate merge progress from 0 to 100% for UI updates
-        def fake_merge_progress():
-            import time
-            for perc in range(0, 101, 2):
-                self._call_progress('merge', {
-                    'downloaded': perc,
-                    'total': 100,
-                    'speed': None,
-                    'percent': perc,
-                    'status': 'processing'
-                })
-                time.sleep(0.01)  # adjust for UI smoothness
-        t = threading.Thread(target=fake_merge_progress)
-        t.start()
-        try:
-            (
-                ffmpeg.input(video_path)
-                .input(audio_path)
-                .output(output_path, c='copy', loglevel='quiet')
-                .run(overwrite_output=True)
-            )
-        except Exception:
-            import subprocess
-            cmd = [
-                'ffmpeg', '-y',
-                '-i', video_path,
-                '-i', audio_path,
-                '-c:v', 'copy',
-                '-c:a', 'copy',
-                output_path
-            ]
-            subprocess.run(cmd, check=True)
-        t.join()
+    @instrument("merge", output=lambda args, result: args['output_path'])
+    def _merge_video_audio(self, video_path, audio_path, output_path, cleanup=True):
+        merge_streams(
+            [(video_path, None), (audio_path, None)], output_path,
+            duration=self.info.get('duration'),
+            progress=lambda stats: self._call_progress('merge', stats),
+        )
+        if not cleanup:
+            return
         for f in (video_path, audio_path):
             try:
                 os.remove(f)
             except Exception:
                 pass
-        
+
+    @instrument("merge", output=lambda args, result: args['output_path'])
+    def _stream_merge(self, video_fmt, audio_fmt, output_path):
+        """
+        Remuxes straight from the stream URLs: ffmpeg pulls both tracks over
+        HTTP and writes the output once, so nothing lands in temp_dir. The
+        two connections hold two governor slots, and the bytes ffmpeg writes
+        (a stream copy, so about what it reads) are charged to its bandwidth.
+        """
+        charged = [0]
+
+        def progress(stats):
+            # ffmpeg cannot be paused mid-read; sleeping here stalls its progress
+            # pipe, which backs up and throttles it all the same
+            self.governor.throttle(stats['downloaded'] - charged[0])
+            charged[0] = max(charged[0], stats['downloaded'])
+            self._call_progress('merge', stats)
+
+        with self.governor.slot(self.priority, count=2):
+            merge_streams(
+                [(video_fmt['url'], video_fmt.get('http_headers')),
+                 (audio_fmt['url'], audio_fmt.get('http_headers'))],
+                output_path,
+                duration=self.info.get('duration'),
+                progress=progress,
+            )
+
+    def _record(self, path, kind, fmt):
+        self.catalog.record(
+            path, kind,
+            video_id=self.info.get('id'),
+            title=self.info.get('title'),
+            fmt=fmt,
+            duration=self.info.get('duration'),
+        )
 
     def _call_progress(self, stage, stats_dict):
-        if self.progress_hook:
+        if self.progress_bus is not None:
+            self.progress_bus.publish(stage, stats_dict, source=self.info.get('id'))
+        elif self.progress_hook:
             self.progress_hook(stage, stats_dict)
 
     def _call_status(self, stage, status):
@@ -0,0 +1,227 @@
+import os
+import sqlite3
+import threading
+import time
+
+CATALOG_PATH = "downloads/.cache/catalog.sqlite3"
+
+MEDIA_EXTENSIONS = {
+    "video": (".mp4", ".webm", ".mkv"),
+    "audio": (".mp3", ".m4a", ".aac", ".wav", ".webm", ".opus"),
+    "transcript": (".md", ".txt"),
+}
+
+SORT_COLUMNS = {
+    "added": "added",
+    "title": "title COLLATE NOCASE",
+    "size": "size",
+    "duration": "duration",
+}
+
+
+class Catalog:
+    """
+    SQLite index of downloaded media and transcripts.
+
+    Rows are written by the downloaders as files are produced (with video id,
+    title, format and duration from the yt-dlp info) and `reconcile` picks up
+    anything added or removed behind our back. Reconciling is incremental:
+    a directory whose mtime has not changed is skipped, and inside a changed
+    directory only files with a new mtime/size are touched. Hidden files
+    (in-progress writes, see src.storage) are never listed.
+
+    `last_used` is when a file was last downloaded or played; it orders
+    quota eviction (see StorageManager).
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS media ("
+            " path TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " filename TEXT NOT NULL,"
+            " video_id TEXT,"
+            " title TEXT,"
+            " format TEXT,"
+            " ext TEXT,"
+            " size INTEGER,"
+            " duration REAL,"
+            " mtime REAL,"
+            " added REAL,"
+            " last_used REAL);"
+            "CREATE INDEX IF NOT EXISTS media_kind_added ON media (kind, added);"
+            "CREATE INDEX IF NOT EXISTS media_video_id ON media (video_id);"
+            "CREATE TABLE IF NOT EXISTS dirs ("
+            " directory TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " mtime REAL NOT NULL,"
+            " PRIMARY KEY (directory, kind));"
+        )
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(media)")]
+        if "last_used" not in columns:
+            self._db.execute("ALTER TABLE media ADD COLUMN last_used REAL")
+        self._db.commit()
+
+    def record(self, path, kind, video_id=None, title=None, fmt=None, duration=None):
+        """Adds or refreshes one file; called right after it is written."""
+        st = os.stat(path)
+        filename = os.path.basename(path)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO media (path, kind, filename, video_id, title, format, ext, size, duration,"
+                " mtime, added, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(path) DO UPDATE SET"
+                " video_id = COALESCE(excluded.video_id, video_id),"
+                " title = COALESCE(excluded.title, title),"
+                " format = COALESCE(excluded.format, format),"
+                " duration = COALESCE(excluded.duration, duration),"
+                " size = excluded.size, mtime = excluded.mtime, added = excluded.added,"
+                " last_used = excluded.last_used",
+                (os.path.abspath(path), kind, filename, video_id,
+                 title or os.path.splitext(filename)[0], fmt,
+                 os.path.splitext(filename)[1].lower(), st.st_size, duration,
+                 st.st_mtime, now, now),
+            )
+            self._db.commit()
+
+    def get(self, path):
+        with self._lock:
+            cur = self._db.execute("SELECT * FROM media WHERE path = ?", (os.path.abspath(path),))
+            row = cur.fetchone()
+            return dict(zip([c[0] for c in cur.description], row)) if row else None
+
+    def touch(self, path):
+        """Marks a file as just used (played), moving it to the back of the eviction order."""
+        with self._lock:
+            self._db.execute("UPDATE media SET last_used = ? WHERE path = ?",
+                             (time.time(), os.path.abspath(path)))
+            self._db.commit()
+
+    def least_recently_used(self, directory):
+        """(path, size, video_id) of a directory's files, least recently used first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, size, video_id FROM media WHERE path LIKE ?"
+                " ORDER BY COALESCE(last_used, added) ASC",
+                (os.path.join(os.path.abspath(directory), "%"),),
+            ).fetchall()
+
+    def usage(self, directory):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM media WHERE path LIKE ?",
+                (os.path.join(os.path.abspath(directory), "%"),),
+            ).fetchone()[0]
+
+    def remove(self, path):
+        with self._lock:
+            self._db.execute("DELETE FROM media WHERE path = ?", (os.path.abspath(path),))
+            self._db.commit()
+
+    def reconcile(self, directory, kind, extensions=None):
+        """Syncs rows for one directory with what is actually on disk."""
+        extensions = tuple(extensions or MEDIA_EXTENSIONS[kind])
+        directory = os.path.abspath(directory)
+        try:
+            dir_mtime = os.stat(directory).st_mtime
+        except FileNotFoundError:
+            return
+        with self._lock:
+            row = self._db.execute(
+                "SELECT mtime FROM dirs WHERE directory = ? AND kind = ?", (directory, kind)
+            ).fetchone()
+            if row and row[0] == dir_mtime:
+                return
+            known = {
+                path: (mtime, size) for path, mtime, size in self._db.execute(
+                    "SELECT path, mtime, size FROM media WHERE kind = ? AND path LIKE ?",
+                    (kind, os.path.join(directory, "%")),
+                )
+            }
+            seen = set()
+            now = time.time()
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if (not entry.is_file() or entry.name.startswith('.')
+                            or not entry.name.lower().endswith(extensions)):
+                        continue
+                    st = entry.stat()
+                    seen.add(entry.path)
+                    if known.get(entry.path) == (st.st_mtime, st.st_size):
+                        continue
+                    self._db.execute(
+                        "INSERT INTO media (path, kind, filename, title, ext, size, mtime, added, last_used)"
+                        " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                        " ON CONFLICT(path) DO UPDATE SET size = excluded.size, mtime = excluded.mtime",
+                        (entry.path, kind, entry.name, os.path.splitext(entry.name)[0],
+                         os.path.splitext(entry.name)[1].lower(), st.st_size, st.st_mtime,
+                         st.st_mtime or now, st.st_mtime or now),
+                    )
+            self._db.executemany(
+                "DELETE FROM media WHERE path = ?", [(p,) for p in known if p not in seen]
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO dirs (directory, kind, mtime) VALUES (?, ?, ?)",
+                (directory, kind, dir_mtime),
+            )
+            self._db.commit()
+
+    def artifacts(self):
+        """(video_id, kind, path, format) for every file whose video id is known."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT video_id, kind, path, format FROM media WHERE video_id IS NOT NULL"
+            ).fetchall()
+
+    def files(self, kind):
+        """(path, size, mtime) of every file of a kind."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT path, size, mtime FROM media WHERE kind = ?", (kind,)).fetchall()
+
+    def _where(self, kind, search, directory):
+        clauses, params = ["kind = ?"], [kind]
+        if directory:
+            clauses.append("path LIKE ?")
+            params.append(os.path.join(os.path.abspath(directory), "%"))
+        if search:
+            clauses.append("(title LIKE ? OR filename LIKE ? OR video_id = ?)")
+            params += [f"%{search}%", f"%{search}%", search]
+        return " AND ".join(clauses), params
+
+    def count(self, kind, search=None, directory=None):
+        where, params = self._where(kind, search, directory)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM media WHERE {where}", params).fetchone()[0]
+
+    def query(self, kind, search=None, sort="added", descending=True, limit=50, offset=0,
+              directory=None):
+        """Returns one page of rows as dicts, newest first by default."""
+        where, params = self._where(kind, search, directory)
+        order = SORT_COLUMNS.get(sort, "added") + (" DESC" if descending else " ASC")
+        with self._lock:
+            cur = self._db.execute(
+                f"SELECT * FROM media WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                params + [limit, offset],
+            )
+            columns = [c[0] for c in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+
+_shared_catalog = None
+_shared_lock = threading.Lock()
+
+
+def get_catalog():
+    global _shared_catalog
+    with _shared_lock:
+        if _shared_catalog is None:
+            _shared_catalog = Catalog()
+        return _shared_catalog
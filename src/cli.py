@@ -0,0 +1,147 @@
+import argparse
+import os
+import sys
+
+from src.governor import get_governor
+from src.job_queue import JobQueue
+from src.metrics import get_metrics, serve_metrics
+from src.previews import PreviewGenerator
+from src.progress_bus import ProgressBus
+from src.storage import StorageManager, parse_size
+from src.sync import SyncArchive, plan_sync, record_job
+
+VIDEO_DIR = "downloads/video"
+AUDIO_DIR = "downloads/audio"
+TRANSCRIPT_DIR = "downloads/transcript"
+TEMP_DIR = "downloads/.temp"
+QUEUE_PATH = "downloads/.queue.json"
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description="Headless batch downloader for videos, playlists and channels.")
+    parser.add_argument("urls", nargs="*", help="video, playlist or channel URLs")
+    parser.add_argument("-f", "--file", help="text file with one URL per line")
+    parser.add_argument("--video", action="store_true", help="download video + audio")
+    parser.add_argument("--audio", action="store_true", help="download audio only")
+    parser.add_argument("--transcript", action="store_true", help="save transcript")
+    parser.add_argument("--max-height", type=int, help="cap video quality, e.g. 720")
+    parser.add_argument("--max-seconds", type=float,
+                        help="pick the best quality that downloads in this time at the measured rate")
+    parser.add_argument("--max-mb", type=float, help="pick the best quality within this size (MiB)")
+    parser.add_argument("-j", "--workers", type=int, default=2)
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--connections", type=int, default=1,
+                        help="parallel ranged connections per stream (plain http formats)")
+    parser.add_argument("--queue", default=QUEUE_PATH, help="queue state file (resumed on restart)")
+    parser.add_argument("--max-connections", type=int,
+                        help="concurrent stream/transcript connections across all jobs (default 8)")
+    parser.add_argument("--max-rate", type=float, help="total download bandwidth cap, MiB/s")
+    parser.add_argument("--metrics-port", type=int, help="serve Prometheus metrics on this port")
+    parser.add_argument("--metrics-log", help="append per-stage metrics as JSON lines to this file")
+    parser.add_argument("--progress", action="store_true", help="print transfer progress once a second")
+    parser.add_argument("--sync", action="store_true",
+                        help="mirror playlists/channels: only fetch videos missing from the archive")
+    parser.add_argument("--stop-after-known", type=int,
+                        help="with --sync, stop listing after this many already archived videos "
+                             "(default: 50 for channels, off for playlists)")
+    parser.add_argument("--quota", action="append", default=[], metavar="KIND=SIZE",
+                        help="size cap for video, audio, transcript or store, e.g. video=50G; "
+                             "least recently used files are evicted (repeatable)")
+    parser.add_argument("--previews", action="store_true",
+                        help="also make poster, thumbnail sprite and preview proxy of every video")
+    parser.add_argument("--quota-total", help="size cap for all downloads together, e.g. 100G")
+    return parser
+
+
+def parse_quotas(values):
+    quotas = {}
+    for value in values:
+        kind, sep, size = value.partition("=")
+        if not sep or kind not in ("video", "audio", "transcript", "store"):
+            raise argparse.ArgumentTypeError(f"bad quota: {value!r} (expected KIND=SIZE)")
+        quotas[kind] = parse_size(size)
+    return quotas
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    urls = list(args.urls)
+    if args.file:
+        with open(args.file, "r", encoding="utf-8") as f:
+            urls += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    kinds = [k for k in ("video", "audio", "transcript") if getattr(args, k)] or ["video"]
+
+    for d in [AUDIO_DIR, VIDEO_DIR, TRANSCRIPT_DIR, TEMP_DIR]:
+        os.makedirs(d, exist_ok=True)
+    if args.metrics_log:
+        get_metrics().jsonl_path = args.metrics_log
+    if args.metrics_port:
+        serve_metrics(args.metrics_port)
+    get_governor().configure(
+        max_connections=args.max_connections,
+        max_bandwidth=int(args.max_rate * 1024 * 1024) if args.max_rate else None)
+
+    previews = PreviewGenerator() if args.previews else None
+    dirs = {'video': VIDEO_DIR, 'audio': AUDIO_DIR, 'transcript': TRANSCRIPT_DIR, 'temp': TEMP_DIR}
+    storage = StorageManager(dirs, quotas=parse_quotas(args.quota), total=parse_size(args.quota_total),
+                             previews=previews)
+    storage.reconcile()
+
+    archive = SyncArchive()
+
+    def report(job):
+        record_job(archive, job)
+        line = f"[{job['state']:>7}] {job['kind']:<10} {job['url']}"
+        if job['state'] == 'done':
+            line += f" -> {job['result']}"
+        elif job['error']:
+            line += f" ({job['error']})"
+        print(line, flush=True)
+
+    def print_progress(stage, stats):
+        eta = f", {int(stats['eta'])} s left" if stats.get('eta') is not None else ""
+        print(f"  {stats.get('source')} {stage}: {stats.get('percent', 0):5.1f}% "
+              f"@ {(stats.get('speed_avg') or 0) / 1024 / 1024:.2f} MiB/s{eta}", flush=True)
+
+    bus = ProgressBus()
+    bus.subscribe(get_metrics().record_progress, rate=2)
+    if args.progress:
+        bus.subscribe(print_progress, rate=1)
+
+    queue = JobQueue(
+        args.queue,
+        dirs=dirs,
+        workers=args.workers,
+        max_retries=args.retries,
+        max_height=args.max_height,
+        max_seconds=args.max_seconds,
+        max_bytes=args.max_mb * 1024 * 1024 if args.max_mb else None,
+        on_update=report,
+        progress_bus=bus,
+        connections=args.connections,
+        storage=storage,
+        previews=previews,
+    )
+    if urls and args.sync:
+        archive.import_catalog()
+        for url in urls:
+            todo = plan_sync(url, kinds, archive, args.stop_after_known)
+            print(f"sync {url}: {len(todo)} new", flush=True)
+            for kind, video_url in todo:
+                queue.add(kind, video_url, {'source': url})
+    elif urls:
+        queue.add_many(urls, kinds)
+    try:
+        queue.run()
+    finally:
+        bus.close()
+        if previews is not None:
+            previews.close(wait=True)
+    counts = queue.counts()
+    print(f"done: {counts['done']}, failed: {counts['failed']}")
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import bisect
+
+AUDIO_BUCKETS = (32, 35, 48, 50, 70, 128, 160)
+
+# Codecs each container takes with `ffmpeg -c copy`; anything else is
+# remuxed into mkv (which takes every codec) rather than re-encoded.
+COPY_CODECS = {
+    'mp4': ({'avc1', 'hvc1', 'hev1', 'av01', 'vp09'}, {'mp4a', 'opus', 'ac-3', 'ec-3', 'mp3'}),
+    'webm': ({'vp8', 'vp09', 'vp9', 'av01'}, {'opus', 'vorbis'}),
+}
+FALLBACK_CONTAINER = 'mkv'
+
+
+def codec_family(codec):
+    """'avc1.640028' -> 'avc1', 'mp4a.40.2' -> 'mp4a', None/'none' -> None."""
+    if not codec or codec == 'none':
+        return None
+    return codec.split('.')[0].lower()
+
+
+def format_size(fmt, duration=None):
+    """filesize, else filesize_approx, else estimated from tbr (kbit/s) * duration."""
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if not size and fmt.get('tbr') and duration:
+        size = int(fmt['tbr'] * 1000 / 8 * duration)
+    return size or 0
+
+
+class FormatPlanner:
+    """
+    Index over an info dict's formats, built once, that answers planning
+    questions for video + audio downloads.
+
+    Video-only and audio-only formats are normalized (codec family, size,
+    bitrate) on construction. Audio formats are grouped by the container
+    they copy into, and each group keeps its size/bitrate Pareto frontier
+    sorted by size, so "best audio that still fits in B bytes" is a binary
+    search rather than a scan.
+
+    Plans are dicts shaped like get_video_audio_combinations() entries
+    (video, audio, height, abr, ext_video, ext_audio, size) plus container
+    (output extension), copy (True when the pair stream-copies into the
+    video's own container) and seconds (predicted transfer time, None
+    without a throughput).
+    """
+
+    def __init__(self, formats, duration=None):
+        self.duration = duration
+        self.videos = []
+        self.audios = []
+        for fmt in formats:
+            vcodec, acodec = codec_family(fmt.get('vcodec')), codec_family(fmt.get('acodec'))
+            entry = {'format': fmt, 'vcodec': vcodec, 'acodec': acodec,
+                     'size': format_size(fmt, duration), 'height': fmt.get('height') or 0,
+                     'fps': fmt.get('fps') or 0, 'ext': fmt.get('ext'),
+                     'bitrate': fmt.get('vbr') or fmt.get('abr') or fmt.get('tbr') or 0}
+            if vcodec and not acodec:
+                self.videos.append(entry)
+            elif acodec and not vcodec:
+                self.audios.append(entry)
+        self.videos.sort(key=lambda v: (v['height'], v['size']))
+        self._frontiers = {}
+        for container in list(COPY_CODECS) + [FALLBACK_CONTAINER]:
+            audios = [a for a in self.audios if a['size'] and (
+                container == FALLBACK_CONTAINER or a['acodec'] in COPY_CODECS[container][1])]
+            self._frontiers[container] = self._frontier(audios)
+
+    @staticmethod
+    def _frontier(audios):
+        frontier = []
+        for a in sorted(audios, key=lambda a: (a['size'], -a['bitrate'])):
+            if not frontier or a['bitrate'] > frontier[-1]['bitrate']:
+                frontier.append(a)
+        return frontier, [a['size'] for a in frontier]
+
+    def best_audio(self, container, max_bytes=None):
+        """Highest bitrate audio that copies into container and is <= max_bytes."""
+        frontier, sizes = self._frontiers.get(container, self._frontiers[FALLBACK_CONTAINER])
+        if not frontier:
+            return None
+        if max_bytes is None:
+            return frontier[-1]
+        i = bisect.bisect_right(sizes, max_bytes)
+        return frontier[i - 1] if i else None
+
+    def smallest_audio(self, container, min_abr=0):
+        frontier, _ = self._frontiers.get(container, self._frontiers[FALLBACK_CONTAINER])
+        return next((a for a in frontier if a['bitrate'] >= min_abr), None)
+
+    def audio_buckets(self, buckets=AUDIO_BUCKETS, tolerance=5):
+        """Smallest audio format near each bitrate bucket, in one pass over the audios."""
+        best = {}
+        for a in self.audios:
+            abr = a['format'].get('abr') or 0
+            for tier in buckets:
+                if abs(abr - tier) <= tolerance:
+                    current = best.get(tier)
+                    if current is None or (a['size'] or float('inf')) < (current['size'] or float('inf')):
+                        best[tier] = a
+        return [best[t]['format'] for t in sorted(best)]
+
+    def plans(self, throughput=None, max_seconds=None, max_bytes=None, min_height=None,
+              max_height=None, copy_only=False, rank="quality", min_abr=0, limit=10):
+        """
+        Ranked video + audio plans meeting every given constraint.
+
+        throughput: bytes/s used to predict seconds (and to turn max_seconds
+            into a byte budget)
+        max_seconds / max_bytes: transfer budget for video + audio together
+        min_height / max_height: video height bounds
+        copy_only: only pairs that stream-copy into the video's container
+        rank: "quality" (height, fps, video bitrate, audio bitrate; best
+            first) or "size" (smallest total first)
+        min_abr: lowest acceptable audio bitrate (kbit/s)
+        """
+        budget = max_bytes
+        if max_seconds is not None and throughput:
+            seconds_budget = max_seconds * throughput
+            budget = seconds_budget if budget is None else min(budget, seconds_budget)
+        plans = []
+        for v in self.videos:
+            if not v['size'] or (min_height and v['height'] < min_height):
+                continue
+            if max_height and v['height'] > max_height:
+                continue
+            remaining = None if budget is None else budget - v['size']
+            if remaining is not None and remaining <= 0:
+                continue
+            for container in self._containers(v, copy_only):
+                if rank == "size":
+                    a = self.smallest_audio(container, min_abr)
+                    if a is not None and remaining is not None and a['size'] > remaining:
+                        a = None
+                else:
+                    a = self.best_audio(container, remaining)
+                    if a is not None and a['bitrate'] < min_abr:
+                        a = None
+                if a is not None:
+                    plans.append(self._plan(v, a, container, throughput))
+                    break
+        if rank == "size":
+            plans.sort(key=lambda p: p['size'])
+        else:
+            plans.sort(key=lambda p: (p['height'], p['video'].get('fps') or 0, p['_vbitrate'],
+                                      p['abr'] or 0, -p['size']), reverse=True)
+        for p in plans:
+            del p['_vbitrate']
+        return plans[:limit] if limit else plans
+
+    def per_height(self, throughput=None, copy_only=False):
+        """The best plan for every available height, lowest first."""
+        best = {}
+        for plan in self.plans(throughput=throughput, copy_only=copy_only, limit=None):
+            best.setdefault(plan['height'], plan)
+        return [best[h] for h in sorted(best)]
+
+    def _containers(self, v, copy_only):
+        """Output containers to try for a video: its own first, then mkv."""
+        if v['ext'] in COPY_CODECS and v['vcodec'] in COPY_CODECS[v['ext']][0]:
+            yield v['ext']
+        if not copy_only or v['ext'] == FALLBACK_CONTAINER:
+            yield FALLBACK_CONTAINER
+
+    def _plan(self, v, a, container, throughput):
+        size = v['size'] + a['size']
+        return {
+            'video': v['format'],
+            'audio': a['format'],
+            'height': v['format'].get('height'),
+            'abr': a['format'].get('abr'),
+            'ext_video': v['ext'],
+            'ext_audio': a['ext'],
+            'container': container,
+            'copy': container == v['ext'],
+            'size': size,
+            'seconds': size / throughput if throughput else None,
+            '_vbitrate': v['bitrate'],
+        }
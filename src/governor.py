@@ -0,0 +1,192 @@
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from src.metrics import get_metrics
+
+INTERACTIVE = 0
+BATCH = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+_RATE_LIMIT_MARKERS = ("429", "too many requests", "rate limit", "ratelimit")
+_RATE_LIMIT_TYPES = ("TooManyRequests", "RequestBlocked", "IpBlocked")
+_ERROR_MARKERS = ("http error 5", "timed out", "connection reset", "temporarily unavailable")
+
+
+def is_rate_limited(error):
+    """True for HTTP 429 / YouTube "too many requests" style failures, however wrapped."""
+    if type(error).__name__ in _RATE_LIMIT_TYPES or getattr(error, 'code', None) == 429:
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in _RATE_LIMIT_MARKERS)
+
+
+def is_server_error(error):
+    """5xx responses, timeouts and dropped connections (but not cancellations)."""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = getattr(error, 'code', None) or getattr(error, 'status', None)
+    if isinstance(code, int) and 500 <= code < 600:
+        return True
+    text = str(error).lower()
+    return any(marker in text for marker in _ERROR_MARKERS)
+
+
+class Governor:
+    """
+    Process-wide limit on concurrent connections and total bandwidth for
+    stream downloads and transcript requests.
+
+    Every transfer runs inside `slot(priority)`. The number of slots is an
+    AIMD window: each success adds 1/window (about one slot per window of
+    successes), a rate-limit answer halves it and other server errors cut it
+    by a quarter, at most once per `cooldown` seconds so one burst of 429s
+    counts once. Waiting interactive transfers always start before batch
+    ones, and `interactive_reserve` slots are kept free of batch work so a UI
+    job never queues behind a channel mirror.
+
+    Bandwidth is a token bucket shared by all transfers: throttle(nbytes)
+    is called per chunk and sleeps the caller as needed.
+
+    max_connections: upper bound (and start value) of the window
+    max_bandwidth: bytes/s across all transfers (None = unlimited)
+    """
+
+    def __init__(self, max_connections=8, max_bandwidth=None, min_connections=1,
+                 interactive_reserve=1, cooldown=2.0):
+        self.max_connections = max_connections
+        self.min_connections = min_connections
+        self.max_bandwidth = max_bandwidth
+        self.interactive_reserve = interactive_reserve
+        self.cooldown = cooldown
+        self.limit = float(max_connections)
+        self._cond = threading.Condition()
+        self._active = {INTERACTIVE: 0, BATCH: 0}
+        self._waiting = []
+        self._seq = itertools.count()
+        self._last_decrease = 0.0
+        self._bw_lock = threading.Lock()
+        self._tokens = 0.0
+        self._refilled = time.monotonic()
+        self.throttled = 0
+        self.errors = 0
+
+    def configure(self, max_connections=None, max_bandwidth=None):
+        with self._cond:
+            if max_connections is not None:
+                self.max_connections = max_connections
+                self.limit = float(max_connections)
+            if max_bandwidth is not None:
+                self.max_bandwidth = max_bandwidth or None
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority=BATCH, count=1):
+        """
+        Holds count connection slots for the duration of a transfer (e.g. 2
+        for an ffmpeg remux reading two URLs). A transfer needing more slots
+        than the current window waits until nothing else runs.
+        """
+        ticket = (priority, next(self._seq), count)
+        waited = time.monotonic()
+        with self._cond:
+            self._waiting.append(ticket)
+            self._cond.wait_for(lambda: self._can_start(ticket))
+            self._waiting.remove(ticket)
+            self._active[priority] += count
+            self._publish()
+        get_metrics().observe("ytscript_governor_wait_seconds", time.monotonic() - waited,
+                              priority=PRIORITY_NAMES.get(priority, str(priority)))
+        try:
+            yield
+        except BaseException as e:
+            self._release(priority, e, count)
+            raise
+        self._release(priority, None, count)
+
+    def throttle(self, nbytes):
+        """Charges nbytes to the shared bandwidth budget, sleeping if it is overdrawn."""
+        rate = self.max_bandwidth
+        if not rate or nbytes <= 0:
+            return
+        with self._bw_lock:
+            now = time.monotonic()
+            # At most a quarter second of burst
+            self._tokens = min(self._tokens + (now - self._refilled) * rate, rate / 4)
+            self._refilled = now
+            self._tokens -= nbytes
+            wait = -self._tokens / rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': self.limit,
+                'active': dict(self._active),
+                'waiting': len(self._waiting),
+                'throttled': self.throttled,
+                'errors': self.errors,
+            }
+
+    def _can_start(self, ticket):
+        if min(self._waiting) != ticket:
+            return False
+        active = sum(self._active.values())
+        window = max(int(self.limit), self.min_connections)
+        if ticket[0] == BATCH:
+            window = max(window - self.interactive_reserve, 1)
+        return active + min(ticket[2], window) <= window
+
+    def _release(self, priority, error, count=1):
+        with self._cond:
+            self._active[priority] -= count
+            if error is None:
+                self.limit = min(self.limit + 1.0 / max(self.limit, 1.0), self.max_connections)
+            else:
+                rate_limited = is_rate_limited(error)
+                if rate_limited or is_server_error(error):
+                    self._decrease(0.5 if rate_limited else 0.75, rate_limited)
+            self._publish()
+            self._cond.notify_all()
+
+    def _decrease(self, factor, rate_limited):
+        if rate_limited:
+            self.throttled += 1
+        else:
+            self.errors += 1
+        get_metrics().inc("ytscript_governor_backoffs_total",
+                          reason="rate_limited" if rate_limited else "error")
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.limit * factor, float(self.min_connections))
+
+    def _publish(self):
+        metrics = get_metrics()
+        metrics.set("ytscript_governor_limit", self.limit)
+        for priority, count in self._active.items():
+            metrics.set("ytscript_governor_active", count, priority=PRIORITY_NAMES[priority])
+
+
+_shared_governor = None
+_shared_lock = threading.Lock()
+
+
+def get_governor():
+    """
+    Process wide governor. GOVERNOR_MAX_CONNECTIONS (default 8) and
+    GOVERNOR_MAX_BANDWIDTH (bytes/s, default unlimited) set its limits.
+    """
+    global _shared_governor
+    with _shared_lock:
+        if _shared_governor is None:
+            bandwidth = os.environ.get("GOVERNOR_MAX_BANDWIDTH")
+            _shared_governor = Governor(
+                max_connections=int(os.environ.get("GOVERNOR_MAX_CONNECTIONS", "8")),
+                max_bandwidth=int(bandwidth) if bandwidth else None,
+            )
+        return _shared_governor
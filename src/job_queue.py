@@ -0,0 +1,408 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+from src.audio_video import AudioVideoDownloader
+from src.governor import BATCH
+from src.metadata_cache import canonical_video_id, extract_info
+from src.metrics import get_metrics
+from src.progress_bus import smooth
+from src.transcript import YTTranscriptText
+from src.ydl_pool import get_ydl_pool
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+JOB_KINDS = ("video", "audio", "transcript")
+
+# Assumed download rate (bytes/s) for time budgets before anything was measured
+DEFAULT_THROUGHPUT = 2 * 1024 * 1024
+
+
+def expand_urls(urls):
+    """
+    Turns a list of video, playlist or channel URLs into single video URLs.
+    Playlists and channels are expanded with flat extraction, so no per-video
+    metadata is fetched here.
+    """
+    expanded = []
+    for url in urls:
+        url = url.strip()
+        if not url:
+            continue
+        if canonical_video_id(url) and 'list=' not in url:
+            expanded.append(url)
+            continue
+        with get_ydl_pool().acquire({'quiet': True, 'no_warnings': True,
+                                     'extract_flat': 'in_playlist'}) as ydl:
+            info = ydl.extract_info(url, download=False)
+        expanded.extend(_flat_entries(info))
+    return expanded
+
+
+def _flat_entries(info):
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        return [info.get('webpage_url') or info.get('url')]
+    urls = []
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        if entry.get('_type') == 'playlist' or entry.get('entries'):
+            urls.extend(_flat_entries(entry))
+        elif entry.get('id'):
+            urls.append(f"https://www.youtube.com/watch?v={entry['id']}")
+        elif entry.get('url'):
+            urls.append(entry['url'])
+    return urls
+
+
+def pick_combination(downloader, max_height=None, max_seconds=None, max_bytes=None,
+                     throughput=None):
+    """
+    Best quality plan within max_height and the transfer budget, or None when
+    nothing fits. throughput defaults to the measured download rate (then
+    DEFAULT_THROUGHPUT) and is only used to turn max_seconds into bytes.
+    """
+    if max_seconds is not None and not throughput:
+        throughput = get_metrics().throughput() or DEFAULT_THROUGHPUT
+    plans = downloader.planner.plans(throughput=throughput, max_seconds=max_seconds,
+                                     max_bytes=max_bytes, max_height=max_height, limit=1)
+    if plans or max_height is None:
+        return plans[0] if plans else None
+    # Nothing at or below max_height: fall back to the smallest that fits
+    plans = downloader.planner.plans(throughput=throughput, max_seconds=max_seconds,
+                                     max_bytes=max_bytes, rank="size", limit=1)
+    return plans[0] if plans else None
+
+
+def pick_audio(downloader):
+    options = downloader.get_audio_options()
+    return max(options, key=lambda a: a.get('abr') or 0) if options else None
+
+
+def combination_format(combo):
+    return f"{combo['video']['format_id']}+{combo['audio']['format_id']}"
+
+
+class JobQueue:
+    """
+    Persistent download queue worked by a bounded pool of threads.
+
+    Every job is a plain dict: id, kind (video/audio/transcript), url, options,
+    state (queued/running/done/failed/cancelled), attempts, error, result and
+    not_before (the earliest time a retry may start). The whole list is
+    rewritten atomically to state_path on every state change, and jobs left
+    "running" by a crash are re-queued on load.
+
+    run() works the queue until it is empty (batch use); start() keeps the
+    workers waiting for new jobs until stop() (service use).
+
+    dirs: dict with video, audio, transcript and temp directories
+    workers: number of jobs run at once
+    max_retries: attempts per job before it is marked failed
+    backoff: base seconds for exponential retry backoff
+    max_height: cap for video quality (None = best available)
+    max_seconds / max_bytes: transfer budget per video job; the best plan
+        that fits is picked (see pick_combination)
+    on_update: function(job), called after every state change
+    progress_bus: ProgressBus handed to every downloader; without one the
+        latest stats of each running job are kept for get()
+    keep_finished: finished jobs kept in the list (None = all)
+    connections: HTTP connections per stream (see AudioVideoDownloader)
+    priority: governor priority of every transfer (INTERACTIVE or BATCH)
+    storage: StorageManager whose quotas are enforced after every finished
+        job (the job's own output is never evicted)
+    previews: PreviewGenerator queued with every finished video (it works
+        in the background, the worker moves on at once)
+    """
+
+    def __init__(self, state_path, dirs, workers=2, max_retries=3, backoff=5.0,
+                 max_height=None, on_update=None, progress_bus=None, keep_finished=None, connections=1,
+                 max_seconds=None, max_bytes=None, priority=BATCH, storage=None, previews=None):
+        self.state_path = state_path
+        self.dirs = dirs
+        self.workers = workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_height = max_height
+        self.max_seconds = max_seconds
+        self.max_bytes = max_bytes
+        self.on_update = on_update
+        self.progress_bus = progress_bus
+        self.keep_finished = keep_finished
+        self.connections = connections
+        self.priority = priority
+        self.storage = storage
+        self.previews = previews
+        self.jobs = []
+        self._lock = threading.Condition()
+        self._serving = False
+        self._stopping = False
+        self._threads = []
+        self._running = {}
+        self._progress = {}
+        self._rates = {}
+        self._load()
+
+    def add(self, kind, url, options=None):
+        """
+        options: per-job choices, e.g. {'format': '137+140'} for video or
+        {'format': '140'} for audio (default: best within max_height and the
+        budget; 'max_seconds'/'max_bytes' override the queue's budget)
+        """
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind: {kind}")
+        options = options or {}
+        with self._lock:
+            for job in self.jobs:
+                if (job['kind'] == kind and job['url'] == url
+                        and job.get('options', {}) == options
+                        and job['state'] not in (FAILED, CANCELLED)):
+                    return job
+            job = {
+                'id': uuid.uuid4().hex[:12],
+                'kind': kind,
+                'url': url,
+                'options': options,
+                'state': QUEUED,
+                'attempts': 0,
+                'error': None,
+                'result': None,
+                'not_before': 0.0,
+            }
+            self.jobs.append(job)
+            self._save()
+            self._lock.notify_all()
+        return job
+
+    def add_many(self, urls, kinds=("video",)):
+        return [self.add(kind, url) for url in expand_urls(urls) for kind in kinds]
+
+    def get(self, job_id):
+        """Copy of one job (with its latest progress while running), or None."""
+        with self._lock:
+            for job in self.jobs:
+                if job['id'] == job_id:
+                    return dict(job, progress=self._progress.get(job_id))
+            return None
+
+    def list(self, ids=None):
+        with self._lock:
+            return [dict(job, progress=self._progress.get(job['id']))
+                    for job in self.jobs if ids is None or job['id'] in ids]
+
+    def cancel(self, job_id):
+        """
+        Queued jobs are cancelled at once; running downloads stop at their
+        next chunk (a running transcript finishes its current request first).
+        Returns the job, or None for an unknown id.
+        """
+        with self._lock:
+            job = next((j for j in self.jobs if j['id'] == job_id), None)
+            if job is None:
+                return None
+            if job['state'] == QUEUED:
+                job['state'] = CANCELLED
+                self._changed(job)
+                self._lock.notify_all()
+            elif job['state'] == RUNNING:
+                job['cancel_requested'] = True
+                downloader = self._running.get(job_id)
+                if downloader is not None:
+                    downloader.cancel_event.set()
+            return dict(job)
+
+    def counts(self):
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)}
+            for job in self.jobs:
+                counts[job['state']] += 1
+            return counts
+
+    def run(self):
+        """Works the queue until no job is queued or running, then returns."""
+        threads = [threading.Thread(target=self._worker, daemon=True)
+                   for _ in range(self.workers)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    def start(self):
+        """Starts workers that keep waiting for new jobs until stop()."""
+        with self._lock:
+            if self._threads:
+                return
+            self._serving = True
+            self._stopping = False
+            self._threads = [threading.Thread(target=self._worker, daemon=True)
+                             for _ in range(self.workers)]
+        for t in self._threads:
+            t.start()
+
+    def stop(self, timeout=None):
+        """Lets running jobs finish, then ends the workers started by start()."""
+        with self._lock:
+            self._serving = False
+            self._stopping = True
+            self._lock.notify_all()
+            threads, self._threads = self._threads, []
+        for t in threads:
+            t.join(timeout)
+
+    def _worker(self):
+        while True:
+            job = self._claim()
+            if job is None:
+                return
+            try:
+                result = self._execute(job)
+            except Exception as e:
+                self._finish(job, error=e)
+            else:
+                self._finish(job, result=result)
+                if self.storage is not None:
+                    try:
+                        self.storage.enforce(protect=[result])
+                    except Exception as e:
+                        # The job is done; a failed eviction must not end the worker
+                        get_metrics().record_hook_failure("storage", e)
+                if self.previews is not None and job['kind'] == 'video':
+                    try:
+                        self.previews.submit_path(result)
+                    except Exception as e:
+                        get_metrics().record_hook_failure("previews", e)
+
+    def _claim(self):
+        with self._lock:
+            while True:
+                if self._stopping:
+                    return None
+                now = time.time()
+                queued = [j for j in self.jobs if j['state'] == QUEUED]
+                ready = [j for j in queued if j['not_before'] <= now]
+                if ready:
+                    job = ready[0]
+                    job['state'] = RUNNING
+                    job['attempts'] += 1
+                    self._changed(job)
+                    return job
+                if (not self._serving and not queued
+                        and not any(j['state'] == RUNNING for j in self.jobs)):
+                    self._lock.notify_all()
+                    return None
+                wait = min((j['not_before'] - now for j in queued), default=None)
+                self._lock.wait(timeout=wait if wait and wait > 0 else 1.0)
+
+    def _finish(self, job, result=None, error=None):
+        with self._lock:
+            self._running.pop(job['id'], None)
+            self._progress.pop(job['id'], None)
+            for key in [k for k in self._rates if k[0] == job['id']]:
+                del self._rates[key]
+            if job.pop('cancel_requested', False):
+                job['state'] = CANCELLED
+                job['error'] = None
+            elif error is None:
+                job['state'] = DONE
+                job['result'] = result
+                job['error'] = None
+            elif job['attempts'] < self.max_retries:
+                get_metrics().record_retry(job['kind'], type(error).__name__)
+                job['state'] = QUEUED
+                job['error'] = str(error)
+                job['not_before'] = time.time() + self.backoff * 2 ** (job['attempts'] - 1)
+            else:
+                job['state'] = FAILED
+                job['error'] = str(error)
+            self._changed(job)
+            self._prune()
+            self._lock.notify_all()
+
+    def _prune(self):
+        if self.keep_finished is None:
+            return
+        finished = [j for j in self.jobs if j['state'] in (DONE, FAILED, CANCELLED)]
+        drop = {id(j) for j in finished[:max(len(finished) - self.keep_finished, 0)]}
+        if drop:
+            self.jobs = [j for j in self.jobs if id(j) not in drop]
+            self._save()
+
+    def _execute(self, job):
+        url = job['url']
+        options = job.get('options') or {}
+        if job['kind'] == 'transcript':
+            yt = YTTranscriptText(url, self.dirs['transcript'], priority=self.priority)
+            return yt.download()
+        downloader = AudioVideoDownloader(
+            url=url,
+            video_dir=self.dirs['video'],
+            audio_dir=self.dirs['audio'],
+            info=extract_info(url),
+            temp_dir=self.dirs['temp'],
+            stream_merge=options.get('stream_merge', False),
+            progress_bus=self.progress_bus,
+            connections=self.connections,
+            priority=self.priority,
+        )
+        if self.progress_bus is None:
+            downloader.progress_hook = lambda stage, stats: self._set_progress(job, stage, stats)
+        with self._lock:
+            self._running[job['id']] = downloader
+            if job.get('cancel_requested'):
+                downloader.cancel_event.set()
+        if job['kind'] == 'audio':
+            audio_options = downloader.get_audio_options()
+            option = next((a for a in audio_options if a['format_id'] == options.get('format')), None)
+            option = option or pick_audio(downloader)
+            if option is None:
+                raise RuntimeError("no audio-only formats available")
+            return downloader.download_audio(option)
+        plans = downloader.planner.plans(limit=None) if options.get('format') else []
+        combo = next((c for c in plans if combination_format(c) == options.get('format')), None)
+        combo = combo or pick_combination(
+            downloader, self.max_height,
+            max_seconds=options.get('max_seconds', self.max_seconds),
+            max_bytes=options.get('max_bytes', self.max_bytes))
+        if combo is None:
+            raise RuntimeError("no video + audio combination fits the limits")
+        return downloader.download_video_with_audio(combo)
+
+    def _set_progress(self, job, stage, stats):
+        # Smoothed like the ProgressBus does, so the UI gets speed_avg and eta too.
+        # Video and audio of one job report in turns: one average per stage.
+        # Under the lock: _finish() drops the job's entries from another thread.
+        now = time.monotonic()
+        key = (job['id'], stage)
+        with self._lock:
+            speed, eta = smooth(self._rates.get(key), stats, now)
+            self._rates[key] = {'downloaded': stats.get('downloaded'), 'speed_avg': speed, '_at': now}
+            self._progress[job['id']] = dict(stats, stage=stage, speed_avg=speed, eta=eta)
+
+    def _changed(self, job):
+        self._save()
+        if self.on_update:
+            self.on_update(dict(job))
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            self.jobs = json.load(f)
+        for job in self.jobs:
+            job.pop('cancel_requested', None)
+            if job['state'] == RUNNING:
+                job['state'] = QUEUED
+
+    def _save(self):
+        if os.path.dirname(self.state_path):
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.jobs, f, indent=1)
+        os.replace(tmp, self.state_path)
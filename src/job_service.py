@@ -0,0 +1,150 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from src.governor import INTERACTIVE
+from src.job_queue import JOB_KINDS, JobQueue
+
+JOBS_PATH = "downloads/.jobs.json"
+
+
+class _JobHandler(BaseHTTPRequestHandler):
+    """
+    GET  /jobs[?ids=a,b]     list jobs
+    GET  /jobs/<id>          one job
+    POST /jobs               submit {"kind", "url", "options"}
+    POST /jobs/<id>/cancel   cancel a job
+    """
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["jobs"]:
+            ids = query.get("ids", [""])[0]
+            self._send(200, self.server.service.list(ids.split(",") if ids else None))
+        elif len(parts) == 2 and parts[0] == "jobs":
+            self._send_job(self.server.service.status(parts[1]))
+        else:
+            self._send(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts == ["jobs"]:
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+                job = self.server.service.submit(body.get("kind"), body.get("url"),
+                                                 body.get("options"))
+            except (ValueError, AttributeError) as e:
+                self._send(400, {"error": str(e)})
+                return
+            self._send(201, job)
+        elif len(parts) == 3 and parts[0] == "jobs" and parts[2] == "cancel":
+            self._send_job(self.server.service.cancel(parts[1]))
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _route(self):
+        url = urlsplit(self.path)
+        return [p for p in url.path.split("/") if p], parse_qs(url.query)
+
+    def _send_job(self, job):
+        if job is None:
+            self._send(404, {"error": "unknown job"})
+        else:
+            self._send(200, job)
+
+    def _send(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class JobService:
+    """
+    Background owner of download and transcript work.
+
+    Jobs run on one bounded JobQueue worker pool shared by every caller, so
+    Streamlit sessions only submit and poll: a rerun or a closed tab never
+    interrupts a transfer, and many sessions cannot start more transfers
+    than `workers`. status()/list() are in-memory lookups cheap enough to
+    poll every second; the same calls are served as JSON over HTTP when
+    `port` is given.
+
+    dirs: dict with video, audio, transcript and temp directories
+    state_path: job list file (queued jobs survive a restart)
+    workers: jobs run at once across all sessions
+    port: local HTTP API port (None = no API, 0 = any free port)
+    keep_finished: finished jobs remembered for status()
+    connections: HTTP connections per stream (see AudioVideoDownloader)
+    storage: StorageManager; orphaned temp files are removed on start and
+        quotas enforced after every job
+    previews: PreviewGenerator fed with every downloaded video
+    """
+
+    def __init__(self, dirs, state_path=JOBS_PATH, workers=2, port=None, host="127.0.0.1",
+                 keep_finished=200, connections=1, storage=None, previews=None):
+        if storage is not None:
+            storage.reconcile()
+        # Someone is waiting in the UI: these go before batch (CLI) transfers
+        self.queue = JobQueue(state_path, dirs, workers=workers, keep_finished=keep_finished,
+                              connections=connections, priority=INTERACTIVE, storage=storage,
+                              previews=previews)
+        self.queue.start()
+        self.server = None
+        if port is not None:
+            self.server = ThreadingHTTPServer((host, port), _JobHandler)
+            self.server.daemon_threads = True
+            self.server.service = self
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def url(self):
+        if self.server is None:
+            return None
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def submit(self, kind, url, options=None):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"unknown job kind: {kind}")
+        if not url:
+            raise ValueError("url is required")
+        return dict(self.queue.add(kind, url, options))
+
+    def status(self, job_id):
+        return self.queue.get(job_id)
+
+    def list(self, ids=None):
+        return self.queue.list(ids)
+
+    def cancel(self, job_id):
+        return self.queue.cancel(job_id)
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        self.queue.stop()
+
+
+_shared_service = None
+_shared_lock = threading.Lock()
+
+
+def get_job_service(dirs, workers=2, port=None, host="127.0.0.1", connections=1, storage=None,
+                    previews=None):
+    """One service per process; later calls return it regardless of arguments."""
+    global _shared_service
+    with _shared_lock:
+        if _shared_service is None:
+            _shared_service = JobService(dirs, workers=workers, port=port, host=host,
+                                         connections=connections, storage=storage,
+                                         previews=previews)
+        return _shared_service
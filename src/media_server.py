@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote, unquote, urlparse
+
+CHUNK_SIZE = 1024 * 1024
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+
+mimetypes.add_type('video/webm', '.webm')
+mimetypes.add_type('video/x-matroska', '.mkv')
+mimetypes.add_type('audio/mp4', '.m4a')
+mimetypes.add_type('audio/aac', '.aac')
+
+
+def parse_range(header, size):
+    """
+    Returns (start, end) inclusive for a single `bytes=` range, None when the
+    header is absent, or raises ValueError for an unsatisfiable range.
+    """
+    if not header:
+        return None
+    m = _RANGE_RE.match(header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        raise ValueError(header)
+    if not m.group(1):
+        length = int(m.group(2))
+        if length == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(m.group(1))
+    end = int(m.group(2)) if m.group(2) else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+class _MediaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(send_body=False)
+
+    def do_GET(self):
+        self._serve(send_body=True)
+
+    def _serve(self, send_body):
+        path = self.server.resolve(unquote(urlparse(self.path).path))
+        if path is None:
+            self.send_error(404)
+            return
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(self.headers.get('Range'), size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(length))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        if byte_range:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if send_body and start == 0 and self.server.on_access is not None:
+            self.server.on_access(path)  # playback (re)started
+        if send_body and length:
+            with open(path, 'rb') as f:
+                self._copy(f, start, length)
+
+    def _copy(self, f, offset, length):
+        self.wfile.flush()
+        try:
+            if hasattr(os, 'sendfile'):
+                sock = self.connection.fileno()
+                while length > 0:
+                    sent = os.sendfile(sock, f.fileno(), offset, min(length, CHUNK_SIZE * 8))
+                    if sent == 0:
+                        break
+                    offset += sent
+                    length -= sent
+            else:
+                f.seek(offset)
+                while length > 0:
+                    chunk = f.read(min(length, CHUNK_SIZE))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    length -= len(chunk)
+        except (BrokenPipeError, ConnectionResetError):
+            # Browsers drop the connection whenever the user seeks.
+            self.close_connection = True
+
+
+class MediaServer(ThreadingHTTPServer):
+    """
+    Tiny local HTTP server that serves files from a few named directories
+    with Range support, so the browser can seek and the Streamlit process
+    never loads the media into memory. Bodies are sent with os.sendfile when
+    the platform has it.
+
+    roots: dict of name -> directory, served as /<name>/<filename>
+    public_url: base URL the browser should use (e.g. behind a proxy);
+        defaults to http://host:port
+    on_access: function(path) called when a file is fetched from its start
+        (e.g. Catalog.touch, so played files are evicted last)
+    """
+    daemon_threads = True
+    on_access = None
+
+    def __init__(self, roots, host="127.0.0.1", port=0, public_url=None):
+        self.roots = {name: os.path.realpath(d) for name, d in roots.items()}
+        super().__init__((host, port), _MediaHandler)
+        self.public_url = (public_url or f"http://{host}:{self.server_address[1]}").rstrip('/')
+
+    def handle_error(self, request, client_address):
+        # Players and downloaders drop keep-alive connections all the time
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def resolve(self, url_path):
+        name, _, filename = url_path.lstrip('/').partition('/')
+        root = self.roots.get(name)
+        if not root or not filename:
+            return None
+        path = os.path.realpath(os.path.join(root, filename))
+        if os.path.commonpath([root, path]) != root or not os.path.isfile(path):
+            return None
+        return path
+
+    def url_for(self, name, filename):
+        return f"{self.public_url}/{quote(name)}/{quote(filename)}"
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+def get_media_server(roots, host="127.0.0.1", port=0, public_url=None):
+    """
+    Starts (once per process and set of roots) a MediaServer on a background
+    thread and returns it. Streamlit reruns the script constantly, so callers
+    must go through this instead of creating servers themselves.
+    """
+    key = (tuple(sorted(roots.items())), host, port, public_url)
+    with _servers_lock:
+        server = _servers.get(key)
+        if server is None:
+            server = MediaServer(roots, host, port, public_url)
+            threading.Thread(target=server.serve_forever, daemon=True).start()
+            _servers[key] = server
+        return server
@@ -0,0 +1,140 @@
+import errno
+import os
+import re
+import shutil
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+STORE_DIR = "downloads/.store"
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+_UNSAFE_RE = re.compile(r'[^0-9A-Za-z_.-]')
+
+
+def _safe(part):
+    return _UNSAFE_RE.sub('_', str(part))
+
+
+def reflink_or_copy(src, dest):
+    """Copy-on-write clone where the filesystem supports it, else a plain copy."""
+    with open(src, 'rb') as fsrc, open(dest, 'wb') as fdst:
+        if fcntl is not None:
+            try:
+                fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                return
+            except OSError:
+                pass
+        shutil.copyfileobj(fsrc, fdst, 8 * 1024 * 1024)
+
+
+class MediaStore:
+    """
+    Local store of downloaded streams keyed by (video id, format id).
+
+    A stream is fetched at most once: later audio or video jobs that need the
+    same format reuse the stored file, and files handed out to the download
+    folders are hardlinks (or reflinks/copies across filesystems) of it.
+    Downloads go straight to the store path; yt-dlp keeps a `.part` file
+    there while transferring, so an interrupted fetch resumes where it
+    stopped on the next attempt. Streams stay after they were merged or
+    linked; the StorageManager's `store` quota evicts the least recently
+    used ones.
+    """
+
+    def __init__(self, root=STORE_DIR):
+        self.root = root
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._held = Counter()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_reused = 0
+
+    def path_for(self, video_id, format_id, ext):
+        video_id = _safe(video_id)
+        return os.path.join(self.root, video_id[:2], video_id, f"{_safe(format_id)}.{_safe(ext)}")
+
+    def lookup(self, video_id, format_id, ext):
+        path = self.path_for(video_id, format_id, ext)
+        return path if os.path.exists(path) else None
+
+    def _lock(self, path):
+        with self._locks_guard:
+            return self._locks.setdefault(path, threading.Lock())
+
+    def fetch(self, video_id, format_id, ext, download):
+        """
+        Returns the stored path for the stream, calling download(path) only
+        when it is not there yet. Concurrent fetches of the same stream wait
+        for the first one instead of downloading it twice.
+        """
+        path = self.path_for(video_id, format_id, ext)
+        with self._lock(path):
+            if os.path.exists(path):
+                self.hits += 1
+                self.bytes_reused += os.path.getsize(path)
+                os.utime(path)  # mtime is the store's eviction order
+                return path
+            self.misses += 1
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            download(path)
+            if not os.path.exists(path):
+                raise FileNotFoundError(errno.ENOENT, "download produced no file", path)
+            return path
+
+    @contextmanager
+    def hold(self, *paths):
+        """
+        Marks stored streams as in use (being fetched, merged or linked) so
+        quota eviction leaves them alone until the block ends.
+        """
+        paths = [os.path.abspath(p) for p in paths]
+        with self._locks_guard:
+            self._held.update(paths)
+        try:
+            yield
+        finally:
+            with self._locks_guard:
+                self._held.subtract(paths)
+                self._held += Counter()  # drops zero counts
+
+    def held(self):
+        with self._locks_guard:
+            return set(self._held)
+
+    def link_into(self, src, dest):
+        """Places src at dest without copying bytes when possible."""
+        if os.path.exists(dest) and os.path.samefile(src, dest):
+            return dest
+        tmp = f"{dest}.link-tmp"
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        try:
+            os.link(src, tmp)
+        except OSError:
+            reflink_or_copy(src, tmp)
+        os.replace(tmp, dest)
+        return dest
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes_reused': self.bytes_reused}
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_media_store():
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = MediaStore()
+        return _shared_store
@@ -0,0 +1,96 @@
+import subprocess
+
+from src.storage import atomic_output
+
+STREAMABLE_PROTOCOLS = ('http', 'https', 'm3u8', 'm3u8_native')
+
+
+def is_streamable(fmt):
+    """True if ffmpeg can read the yt-dlp format straight from its URL."""
+    return bool(fmt.get('url')) and fmt.get('protocol', 'https') in STREAMABLE_PROTOCOLS
+
+
+def _headers_arg(headers):
+    return ''.join(f"{k}: {v}\r\n" for k, v in (headers or {}).items())
+
+
+def build_merge_command(inputs, output_path):
+    """
+    inputs: list of (source, http_headers or None); the first input gives the
+    video track and the second the audio track. Sources may be local paths or
+    URLs. Streams are copied, never re-encoded.
+    """
+    cmd = ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error',
+           '-progress', 'pipe:1']
+    for source, headers in inputs:
+        if headers:
+            cmd += ['-headers', _headers_arg(headers)]
+        cmd += ['-i', source]
+    cmd += ['-map', '0:v:0', '-map', '1:a:0', '-c', 'copy', output_path]
+    return cmd
+
+
+def parse_progress(lines, duration=None):
+    """
+    Turns ffmpeg `-progress` key=value lines into stats dicts shaped like the
+    downloader's progress updates. One dict per progress block.
+    """
+    block = {}
+    for line in lines:
+        key, sep, value = line.strip().partition('=')
+        if not sep:
+            continue
+        block[key] = value
+        if key != 'progress':
+            continue
+        out_us = block.get('out_time_us') or block.get('out_time_ms') or '0'
+        try:
+            out_time = max(int(out_us), 0) / 1_000_000
+        except ValueError:
+            out_time = 0.0
+        try:
+            written = int(block.get('total_size') or 0)
+        except ValueError:
+            written = 0
+        done = value == 'end'
+        if done:
+            percent = 100.0
+        elif duration:
+            percent = min(out_time / duration * 100, 99.9)
+        else:
+            percent = 0.0
+        yield {
+            'downloaded': written,
+            'total': 0,
+            'speed': None,
+            'percent': percent,
+            'out_time': out_time,
+            'status': 'finished' if done else 'processing',
+        }
+        block = {}
+
+
+def merge_streams(inputs, output_path, duration=None, progress=None):
+    """
+    Runs ffmpeg and reports real progress through progress(stats) as it
+    works. Raises CalledProcessError (with ffmpeg's stderr) on failure.
+    ffmpeg writes to a hidden temp name that only replaces output_path once
+    it exited cleanly, so a crash never leaves a truncated output.
+    """
+    with atomic_output(output_path) as tmp_path:
+        cmd = build_merge_command(inputs, tmp_path)
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                stdin=subprocess.DEVNULL, text=True)
+        try:
+            for stats in parse_progress(proc.stdout, duration):
+                if progress:
+                    progress(stats)
+            stderr = proc.stderr.read()
+            returncode = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+    return output_path
@@ -0,0 +1,189 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from src.metrics import get_metrics
+from src.ydl_pool import get_ydl_pool
+
+CACHE_PATH = "downloads/.cache/metadata.sqlite3"
+
+_VIDEO_ID_RE = re.compile(
+    r'(?:[?&]v=|youtu\.be/|/shorts/|/embed/|/live/|/v/)([0-9A-Za-z_-]{11})(?![0-9A-Za-z_-])'
+)
+_BARE_ID_RE = re.compile(r'^[0-9A-Za-z_-]{11}$')
+
+
+def canonical_video_id(url):
+    """
+    Returns the 11 character YouTube video id for a watch/short/embed URL
+    (or a bare id), or None when the URL does not point at a single video.
+    """
+    url = (url or '').strip()
+    if _BARE_ID_RE.match(url):
+        return url
+    m = _VIDEO_ID_RE.search(url)
+    return m.group(1) if m else None
+
+
+class MetadataCache:
+    """
+    Two tier cache for yt-dlp `extract_info` results.
+
+    The memory tier is a small LRU of info dicts; the disk tier is a SQLite
+    table of JSON blobs with a TTL (stream URLs inside `formats` expire, so
+    entries must not live forever) and size based eviction of the least
+    recently used rows.
+
+    path: sqlite file, parent dir is created if missing
+    memory_size: max info dicts kept in memory
+    ttl: seconds an entry stays valid (both tiers)
+    max_disk_bytes: total JSON bytes kept on disk before evicting
+    """
+
+    def __init__(self, path=CACHE_PATH, memory_size=64, ttl=3 * 3600,
+                 max_disk_bytes=256 * 1024 * 1024):
+        self.path = path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_disk_bytes = max_disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS metadata ("
+            " key TEXT PRIMARY KEY,"
+            " created REAL NOT NULL,"
+            " accessed REAL NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " info TEXT NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            self._memory.pop(key, None)
+            row = self._db.execute(
+                "SELECT created, info FROM metadata WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[0] < self.ttl:
+                self._db.execute("UPDATE metadata SET accessed = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                info = json.loads(row[1])
+                self._remember(key, row[0], info)
+                self.disk_hits += 1
+                return info
+            if row:
+                self._db.execute("DELETE FROM metadata WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def put(self, key, info):
+        now = time.time()
+        blob = json.dumps(info)
+        with self._lock:
+            self._remember(key, now, info)
+            self._db.execute(
+                "INSERT OR REPLACE INTO metadata (key, created, accessed, size, info) VALUES (?, ?, ?, ?, ?)",
+                (key, now, now, len(blob), blob),
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key, None)
+            self._db.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            self._db.commit()
+
+    def extract_info(self, url, ydl_opts=None):
+        """
+        Cached replacement for `YoutubeDL(opts).extract_info(url, download=False)`.
+        Entries are keyed by video id so different URL spellings share one entry.
+        """
+        video_id = canonical_video_id(url)
+        key = video_id or url
+        info = self.get(key)
+        if info is not None:
+            return info
+        opts = {'quiet': True, 'no_warnings': True, 'skip_download': True}
+        if video_id:
+            # watch?v=...&list=... is the video, not its playlist
+            opts['noplaylist'] = True
+        opts.update(ydl_opts or {})
+        with get_metrics().stage("info"), get_ydl_pool().acquire(opts) as ydl:
+            info = ydl.sanitize_info(ydl.extract_info(url, download=False))
+        if info.get('id'):
+            self.put(info['id'], info)
+        # A video id only ever maps to that video's own info
+        if key != info.get('id') and video_id is None:
+            self.put(key, info)
+        return info
+
+    def stats(self):
+        with self._lock:
+            rows, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM metadata"
+            ).fetchone()
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'disk_entries': rows,
+                'disk_bytes': size,
+            }
+
+    def _remember(self, key, created, info):
+        self._memory[key] = (created, info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now):
+        self._db.execute("DELETE FROM metadata WHERE created < ?", (now - self.ttl,))
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM metadata").fetchone()[0]
+        if total <= self.max_disk_bytes:
+            return
+        for key, size in self._db.execute(
+            "SELECT key, size FROM metadata ORDER BY accessed ASC"
+        ).fetchall():
+            if total <= self.max_disk_bytes:
+                break
+            self._db.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            self._memory.pop(key, None)
+            total -= size
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_cache():
+    """Process wide cache shared by the UI, downloader and transcript paths."""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = MetadataCache()
+        return _shared_cache
+
+
+def extract_info(url, ydl_opts=None):
+    return get_cache().extract_info(url, ydl_opts)
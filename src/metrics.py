@@ -0,0 +1,240 @@
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, float('inf'))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class StageRecord:
+    """Handed out by Metrics.stage(); set .bytes before the block ends."""
+
+    def __init__(self, stage, labels):
+        self.stage = stage
+        self.labels = labels
+        self.bytes = 0
+        self.started = time.monotonic()
+
+
+class Metrics:
+    """
+    In-process counters and histograms for the download pipeline.
+
+    Every stage (info, video, audio, merge, transcript) records its duration,
+    bytes moved and outcome; job retries are counted separately. `render()`
+    produces the Prometheus text format and, when jsonl_path is set, each
+    finished stage is also appended to that file as one JSON object per line.
+    """
+
+    def __init__(self, jsonl_path=None):
+        self.jsonl_path = jsonl_path
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, buckets=DURATION_BUCKETS, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {'buckets': buckets, 'counts': [0] * len(buckets),
+                                                'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(hist['buckets']):
+                if value <= bound:
+                    hist['counts'][i] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+
+    def stage(self, stage, **labels):
+        """Context manager timing one stage run: `with metrics.stage("video") as rec:`"""
+        return _StageContext(self, StageRecord(stage, labels))
+
+    def record_progress(self, stage, stats):
+        """
+        ProgressBus subscriber: live speed / ETA gauges per stage. Not
+        labelled by video: a long batch would add series without bound, so
+        concurrent transfers of one stage share (and overwrite) the gauges.
+        """
+        labels = {'stage': stage}
+        self.set("ytscript_progress_percent", stats.get('percent') or 0.0, **labels)
+        if stats.get('speed_avg') is not None:
+            self.set("ytscript_progress_speed_bytes_per_second", stats['speed_avg'], **labels)
+        if stats.get('eta') is not None:
+            self.set("ytscript_progress_eta_seconds", stats['eta'], **labels)
+
+    def record_retry(self, stage, reason):
+        self.inc("ytscript_retries_total", stage=stage, reason=reason)
+        self._log({'event': 'retry', 'stage': stage, 'reason': reason})
+
+    def record_hook_failure(self, hook, error):
+        """A post-job step (quota enforcement, preview queueing) raised; the job itself is done."""
+        reason = type(error).__name__
+        self.inc("ytscript_hook_failures_total", hook=hook, reason=reason)
+        self._log({'event': 'hook_failure', 'hook': hook, 'reason': reason, 'error': str(error)})
+
+    def finish_stage(self, record, error=None):
+        elapsed = time.monotonic() - record.started
+        labels = dict(record.labels, stage=record.stage)
+        outcome = "failed" if error else "ok"
+        self.observe("ytscript_stage_duration_seconds", elapsed, **labels)
+        self.inc("ytscript_stage_runs_total", outcome=outcome, **labels)
+        if record.bytes:
+            self.inc("ytscript_stage_bytes_total", record.bytes, **labels)
+            if elapsed > 0:
+                self.set("ytscript_stage_throughput_bytes_per_second", record.bytes / elapsed, **labels)
+        reason = None
+        if error is not None:
+            reason = type(error).__name__
+            self.inc("ytscript_stage_failures_total", reason=reason, **labels)
+        self._log({
+            'event': 'stage', 'stage': record.stage, 'labels': record.labels,
+            'seconds': round(elapsed, 6), 'bytes': record.bytes,
+            'throughput': record.bytes / elapsed if record.bytes and elapsed > 0 else None,
+            'outcome': outcome, 'reason': reason,
+            'error': str(error) if error is not None else None,
+        })
+
+    def throughput(self, stages=("video", "audio")):
+        """Measured bytes/s over all finished runs of the given stages, or None."""
+        total_bytes = total_seconds = 0.0
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                if name == "ytscript_stage_bytes_total" and dict(labels).get('stage') in stages:
+                    total_bytes += value
+            for (name, labels), hist in self._histograms.items():
+                if name == "ytscript_stage_duration_seconds" and dict(labels).get('stage') in stages:
+                    total_seconds += hist['sum']
+        return total_bytes / total_seconds if total_bytes and total_seconds else None
+
+    def render(self):
+        """Prometheus text exposition of everything recorded so far."""
+        lines = []
+        with self._lock:
+            for kind, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted({n for n, _ in store}):
+                    lines.append(f"# TYPE {name} {kind}")
+                    for (n, labels), value in sorted(store.items()):
+                        if n == name:
+                            lines.append(f"{name}{_label_text(labels)} {value}")
+            for name in sorted({n for n, _ in self._histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (n, labels), hist in sorted(self._histograms.items()):
+                    if n != name:
+                        continue
+                    for bound, count in zip(hist['buckets'], hist['counts']):
+                        le = "+Inf" if bound == float('inf') else repr(float(bound))
+                        lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {count}")
+                    lines.append(f"{name}_sum{_label_text(labels)} {hist['sum']}")
+                    lines.append(f"{name}_count{_label_text(labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def _log(self, event):
+        if not self.jsonl_path:
+            return
+        event = dict(event, ts=time.time())
+        with self._lock:
+            with open(self.jsonl_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event) + "\n")
+
+
+class _StageContext:
+    def __init__(self, metrics, record):
+        self.metrics = metrics
+        self.record = record
+
+    def __enter__(self):
+        return self.record
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics.finish_stage(self.record, error=exc)
+        return False
+
+
+def instrument(stage, output=None):
+    """
+    Decorator that records a function call as a pipeline stage.
+    stage: stage name, or function(arguments) -> name for methods that take
+        the stage as a parameter
+    output: function(arguments, result) -> path of the produced file, whose
+        size is counted as the stage's bytes
+    `arguments` is the dict of bound call arguments (including self).
+    """
+    def decorate(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            arguments = signature.bind(*args, **kwargs).arguments
+            name = stage(arguments) if callable(stage) else stage
+            with get_metrics().stage(name) as record:
+                result = fn(*args, **kwargs)
+                path = output(arguments, result) if output else None
+                if path and os.path.exists(path):
+                    record.bytes = os.path.getsize(path)
+            return result
+        return wrapper
+    return decorate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = get_metrics().render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+_shared_metrics = None
+_metrics_server = None
+_shared_lock = threading.Lock()
+
+
+def get_metrics():
+    """Process wide registry; METRICS_LOG (env) enables the JSON-lines log."""
+    global _shared_metrics
+    with _shared_lock:
+        if _shared_metrics is None:
+            _shared_metrics = Metrics(jsonl_path=os.environ.get("METRICS_LOG"))
+        return _shared_metrics
+
+
+def serve_metrics(port, host="127.0.0.1"):
+    """Starts the /metrics endpoint once per process and returns the server."""
+    global _metrics_server
+    with _shared_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            _metrics_server.daemon_threads = True
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,240 @@
+import hashlib
+import os
+import shutil
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.catalog import get_catalog
+from src.metrics import instrument
+from src.storage import atomic_output
+
+PREVIEW_DIR = "downloads/.cache/previews"
+POSTER = "poster.jpg"
+SPRITE = "sprite.jpg"
+PROXY = "proxy.mp4"
+SOURCE = "source.txt"  # path of the video the previews were made from
+
+SPRITE_COLUMNS = 5
+SPRITE_ROWS = 5
+SPRITE_WIDTH = 160
+POSTER_WIDTH = 480
+PROXY_HEIGHT = 240
+PROXY_VIDEO_BITRATE = "300k"
+PROXY_AUDIO_BITRATE = "48k"
+# ffmpeg threads per job: the pool, not ffmpeg, spreads the work over cores
+FFMPEG_THREADS = 2
+
+
+def preview_key(path, size, mtime):
+    """Cache key of a file's previews; a rewritten file gets a new key."""
+    return hashlib.sha1(f"{os.path.abspath(path)}\0{size}\0{mtime}".encode()).hexdigest()
+
+
+def _ffmpeg(*args):
+    return ['ffmpeg', '-y', '-hide_banner', '-nostats', '-loglevel', 'error',
+            '-threads', str(FFMPEG_THREADS), *args]
+
+
+def build_poster_command(source, output_path, at=0.0, width=POSTER_WIDTH):
+    return _ffmpeg('-ss', f"{at:.2f}", '-i', source, '-frames:v', '1',
+                   '-vf', f"scale={width}:-2", '-q:v', '4', output_path)
+
+
+def build_sprite_command(source, output_path, duration=None, columns=SPRITE_COLUMNS,
+                         rows=SPRITE_ROWS, width=SPRITE_WIDTH):
+    """One image of columns x rows frames spread evenly over the video."""
+    frames = columns * rows
+    rate = f"{frames}/{duration:.3f}" if duration else "1/10"
+    return _ffmpeg('-i', source, '-an', '-frames:v', '1', '-q:v', '5',
+                   '-vf', f"fps={rate},scale={width}:-2,tile={columns}x{rows}", output_path)
+
+
+def build_proxy_command(source, output_path, height=PROXY_HEIGHT,
+                        video_bitrate=PROXY_VIDEO_BITRATE, audio_bitrate=PROXY_AUDIO_BITRATE):
+    """Small H.264/AAC mp4 with the index up front, so it starts playing at once."""
+    return _ffmpeg('-i', source, '-map', '0:v:0', '-map', '0:a:0?',
+                   '-vf', f"scale=-2:'min({height},ih)'",
+                   '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', video_bitrate,
+                   '-maxrate', video_bitrate, '-bufsize', video_bitrate,
+                   '-c:a', 'aac', '-b:a', audio_bitrate, '-ac', '1',
+                   '-movflags', '+faststart', output_path)
+
+
+def _run(cmd):
+    # Below normal priority: previews must not slow down downloads and merges
+    preexec = (lambda: os.nice(10)) if hasattr(os, 'nice') else None
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            stdin=subprocess.DEVNULL, text=True, preexec_fn=preexec)
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, cmd, stderr=result.stderr)
+
+
+class PreviewGenerator:
+    """
+    Generates a poster frame, a thumbnail sprite and a low bitrate proxy of
+    downloaded videos on a background pool of ffmpeg processes.
+
+    Previews live in `<root>/<key[:2]>/<key>/` where the key hashes the
+    file's path, size and mtime, so a replaced file simply gets new
+    previews; prune() drops the ones no catalog file points to anymore.
+    Every artifact is written to a temp name and renamed, so a preview that
+    exists is complete.
+
+    root: cache directory
+    workers: videos processed at once (default: half the CPU cores, as
+        each ffmpeg runs with FFMPEG_THREADS threads)
+    proxy: also transcode the preview proxy (the expensive part)
+    """
+
+    def __init__(self, root=PREVIEW_DIR, workers=None, proxy=True):
+        self.root = root
+        self.workers = workers or max((os.cpu_count() or 2) // FFMPEG_THREADS, 1)
+        self.proxy = proxy
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="preview")
+        self._pending = {}
+        self._failed = set()
+        # Reentrant: a future that is already done runs its callback in submit()
+        self._lock = threading.RLock()
+        self.generated = 0
+        self.failed = 0
+
+    def directory(self, path, size=None, mtime=None):
+        if size is None or mtime is None:
+            st = os.stat(path)
+            size, mtime = st.st_size, st.st_mtime
+        key = preview_key(path, size, mtime)
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, row):
+        """
+        Paths of the finished previews of a catalog row ({} if none yet),
+        keyed by 'poster', 'sprite' and 'proxy'.
+        """
+        directory = self.directory(row['path'], row['size'], row['mtime'])
+        found = {}
+        for name, filename in (('poster', POSTER), ('sprite', SPRITE), ('proxy', PROXY)):
+            path = os.path.join(directory, filename)
+            if os.path.exists(path):
+                found[name] = path
+        return found
+
+    def submit(self, row):
+        """
+        Queues preview generation for a catalog row unless it is complete,
+        already queued or failed before. Returns at once with a Future (or
+        None).
+        """
+        directory = self.directory(row['path'], row['size'], row['mtime'])
+        wanted = (SOURCE, POSTER, SPRITE, PROXY) if self.proxy else (SOURCE, POSTER, SPRITE)
+        if directory in self._failed or all(os.path.exists(os.path.join(directory, f)) for f in wanted):
+            return None
+        with self._lock:
+            future = self._pending.get(directory)
+            if future is None:
+                future = self._pool.submit(self._generate, row['path'], directory,
+                                           row.get('duration'))
+                self._pending[directory] = future
+                future.add_done_callback(lambda _: self._done(directory))
+            return future
+
+    def submit_path(self, path, catalog=None):
+        """JobQueue hook: previews for a video that was just recorded."""
+        catalog = catalog if catalog is not None else get_catalog()
+        row = catalog.get(path)
+        return self.submit(row) if row else None
+
+    def source_of(self, path):
+        """Original video of a preview file (None for paths outside the cache)."""
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(path)
+        if os.path.commonpath([root, path]) != root:
+            return None
+        try:
+            with open(os.path.join(os.path.dirname(path), SOURCE), encoding="utf-8") as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def prune(self, catalog=None):
+        """
+        Removes previews of files that were deleted or rewritten. Returns the
+        count. New work waits while it runs, and queued directories are
+        left alone.
+        """
+        catalog = catalog if catalog is not None else get_catalog()
+        removed = 0
+        with self._lock:
+            valid = {preview_key(path, size, mtime) for path, size, mtime in catalog.files("video")}
+            if not os.path.isdir(self.root):
+                return removed
+            for prefix in os.listdir(self.root):
+                for key in os.listdir(os.path.join(self.root, prefix)):
+                    directory = os.path.join(self.root, prefix, key)
+                    if key not in valid and directory not in self._pending:
+                        shutil.rmtree(directory, ignore_errors=True)
+                        removed += 1
+        return removed
+
+    def remove(self, path, size, mtime):
+        """Drops the previews of one video (StorageManager eviction hook)."""
+        with self._lock:
+            directory = self.directory(path, size, mtime)
+            if directory not in self._pending:
+                shutil.rmtree(directory, ignore_errors=True)
+
+    def close(self, wait=False):
+        """wait: finish the queued previews first (batch use) instead of dropping them."""
+        self._pool.shutdown(wait=wait, cancel_futures=not wait)
+
+    def _done(self, directory):
+        with self._lock:
+            self._pending.pop(directory, None)
+
+    @instrument("preview", output=lambda args, result: result)
+    def _generate(self, source, directory, duration=None):
+        os.makedirs(directory, exist_ok=True)
+        with atomic_output(os.path.join(directory, SOURCE)) as tmp_path, \
+                open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(os.path.abspath(source))
+        steps = [
+            (POSTER, lambda out: build_poster_command(source, out, at=(duration or 0) * 0.1)),
+            (SPRITE, lambda out: build_sprite_command(source, out, duration)),
+        ]
+        if self.proxy:
+            steps.append((PROXY, lambda out: build_proxy_command(source, out)))
+        try:
+            for filename, command in steps:
+                path = os.path.join(directory, filename)
+                if os.path.exists(path):
+                    continue
+                with atomic_output(path) as tmp_path:
+                    _run(command(tmp_path))
+        except Exception:
+            self.failed += 1
+            self._failed.add(directory)
+            raise
+        self.generated += 1
+        return os.path.join(directory, PROXY) if self.proxy else os.path.join(directory, POSTER)
+
+
+_shared_generator = None
+_shared_lock = threading.Lock()
+
+
+def get_preview_generator():
+    """
+    Process wide generator (PREVIEW_WORKERS sets its pool size). Stale
+    previews are pruned when it is created, before it accepts any work.
+    """
+    global _shared_generator
+    with _shared_lock:
+        if _shared_generator is None:
+            workers = os.environ.get("PREVIEW_WORKERS")
+            _shared_generator = PreviewGenerator(workers=int(workers) if workers else None)
+            _shared_generator.prune()
+        return _shared_generator
@@ -0,0 +1,125 @@
+import math
+import threading
+import time
+
+
+def smooth(prev, stats, now, smoothing=3.0):
+    """
+    (speed_avg, eta) for stats following prev (the last stats of the same
+    transfer with its speed_avg and `_at` time, or None): an exponential
+    moving average of the byte rate with time constant `smoothing` seconds.
+    """
+    speed = prev['speed_avg'] if prev else None
+    downloaded = stats.get('downloaded')
+    if prev and downloaded is not None and prev.get('downloaded') is not None:
+        dt = now - prev['_at']
+        delta = downloaded - prev['downloaded']
+        if dt > 0 and delta >= 0:
+            current = delta / dt
+            if speed is None:
+                speed = current
+            else:
+                alpha = 1 - math.exp(-dt / smoothing)
+                speed += alpha * (current - speed)
+    elif prev is None and stats.get('speed'):
+        speed = stats['speed']
+    total = stats.get('total') or 0
+    eta = None
+    if speed and total and downloaded is not None:
+        eta = max(total - downloaded, 0) / speed
+    return speed, eta
+
+
+class Subscription:
+    def __init__(self, bus, callback, interval):
+        self.bus = bus
+        self.callback = callback
+        self.interval = interval
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.errors = 0
+
+    def _run(self):
+        seen = 0
+        while True:
+            pending, seen, closed = self.bus._wait_newer(seen)
+            for event in pending:
+                try:
+                    self.callback(event['stage'], event)
+                except Exception:
+                    # A broken consumer must not take the others down
+                    self.errors += 1
+            if closed:
+                return
+            time.sleep(self.interval)
+
+
+class ProgressBus:
+    """
+    Coalescing, rate-limited fan-out for download progress.
+
+    publish() is what the transfer thread calls for every chunk: it only
+    updates the latest stats for that (source, stage) under a lock and
+    returns, so the transfer never waits on a consumer. Each subscriber has
+    its own thread that wakes at most `rate` times per second and receives
+    only the newest stats of every stage that changed meanwhile, so slow
+    consumers see fewer, fresher updates instead of a backlog.
+
+    Delivered stats are the published dict plus stage, source, a smoothed
+    `speed_avg` (bytes/s, exponential moving average with time constant
+    `smoothing` seconds) and `eta` (seconds, None when unknown).
+    """
+
+    def __init__(self, smoothing=3.0):
+        self.smoothing = smoothing
+        self._cond = threading.Condition()
+        self._latest = {}
+        self._version = 0
+        self._closed = False
+        self._subscriptions = []
+
+    def subscribe(self, callback, rate=10.0, wrap_thread=None):
+        """
+        callback: function(stage, stats)
+        rate: max deliveries per second for this subscriber
+        wrap_thread: function(thread) called before the delivery thread
+            starts, e.g. to attach a UI framework's context
+        """
+        sub = Subscription(self, callback, 1.0 / rate if rate else 0.0)
+        if wrap_thread:
+            wrap_thread(sub.thread)
+        with self._cond:
+            self._subscriptions.append(sub)
+        sub.thread.start()
+        return sub
+
+    def publish(self, stage, stats, source=None):
+        now = time.monotonic()
+        key = (source, stage)
+        with self._cond:
+            if self._closed:
+                return
+            speed, eta = smooth(self._latest.get(key), stats, now, self.smoothing)
+            self._version += 1
+            self._latest[key] = dict(stats, stage=stage, source=source, speed_avg=speed, eta=eta,
+                                     _at=now, _version=self._version)
+            self._cond.notify_all()
+
+    def close(self, timeout=5.0):
+        """Delivers whatever is pending, then stops all subscriber threads."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            subs = list(self._subscriptions)
+        for sub in subs:
+            if sub.thread is not threading.current_thread():
+                sub.thread.join(timeout)
+
+    def _wait_newer(self, seen):
+        with self._cond:
+            self._cond.wait_for(lambda: self._version > seen or self._closed)
+            pending = sorted(
+                (e for e in self._latest.values() if e['_version'] > seen),
+                key=lambda e: e['_version'],
+            )
+            events = [{k: v for k, v in e.items() if not k.startswith('_')} for e in pending]
+            return events, self._version, self._closed
@@ -0,0 +1,250 @@
+import http.client
+import json
+import os
+import queue
+import re
+import threading
+import time
+import urllib.request
+from contextlib import nullcontext
+from urllib.parse import urljoin, urlsplit
+
+SEGMENT_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+SEGMENTED_PROTOCOLS = ('http', 'https')
+
+_CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+
+
+class RangeNotSupported(Exception):
+    """The server ignores Range requests or does not report a total size."""
+
+
+def is_segmentable(fmt):
+    """True for a plain single-file http(s) format (no HLS/DASH fragments)."""
+    return (fmt.get('protocol') in SEGMENTED_PROTOCOLS and bool(fmt.get('url'))
+            and not fmt.get('fragments'))
+
+
+def split_ranges(size, segment_size=SEGMENT_SIZE):
+    """[(start, end)] inclusive byte ranges covering size bytes."""
+    return [(start, min(start + segment_size, size) - 1) for start in range(0, size, segment_size)]
+
+
+def probe(url, headers=None, timeout=30):
+    """
+    Follows redirects with a one byte range request and returns
+    (final_url, total_size, validator). Raises RangeNotSupported when the
+    answer is not a 206 with a Content-Range total.
+    """
+    req = urllib.request.Request(url, headers=dict(headers or {}, Range='bytes=0-0'))
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        m = _CONTENT_RANGE_RE.match(resp.headers.get('Content-Range') or '')
+        if resp.status != 206 or not m:
+            raise RangeNotSupported(url)
+        validator = resp.headers.get('ETag') or resp.headers.get('Last-Modified')
+        return resp.geturl(), int(m.group(3)), validator
+
+
+class _Connection:
+    """One keep-alive connection reused for every segment a worker fetches."""
+
+    def __init__(self, url, headers, timeout):
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+        self.conn = None
+
+    def _open(self, parts):
+        cls = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        return cls(parts.netloc, timeout=self.timeout)
+
+    def get_range(self, start, end):
+        url = self.url
+        for _ in range(5):
+            parts = urlsplit(url)
+            if self.conn is None:
+                self.conn = self._open(parts)
+            path = parts.path + (f"?{parts.query}" if parts.query else "")
+            self.conn.request('GET', path or '/', headers=dict(self.headers, Range=f'bytes={start}-{end}'))
+            resp = self.conn.getresponse()
+            if resp.status in (301, 302, 303, 307, 308):
+                resp.read()
+                url = urljoin(url, resp.headers['Location'])
+                self.close()
+                continue
+            if resp.status != 206:
+                resp.read()
+                raise RangeNotSupported(f"HTTP {resp.status} for range {start}-{end}")
+            return resp
+        raise http.client.HTTPException(f"too many redirects: {self.url}")
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+
+class SegmentedDownload:
+    """
+    Fetches one file as byte ranges over `connections` parallel keep-alive
+    connections, writing every range at its offset into a preallocated
+    `<output>.segments.part` file (not `.part`, which is yt-dlp's).
+
+    Progress of every segment is kept in `<output>.segments.json`, so an
+    interrupted download resumes each segment where it stopped (as long as
+    the remote size and ETag/Last-Modified still match). When all segments
+    are complete and the file has the expected size it is renamed to
+    output_path.
+
+    report: function(stats) with downloaded/total/speed/percent/status
+    cancel_event: threading.Event, aborts at the next chunk
+    retries: attempts per segment before the whole download fails
+    governor: Governor every segment request takes a slot from (and whose
+        bandwidth budget every chunk is charged to), at `priority`
+    """
+
+    def __init__(self, url, output_path, connections=4, segment_size=SEGMENT_SIZE, headers=None,
+                 report=None, cancel_event=None, retries=3, timeout=30, governor=None, priority=None):
+        self.url = url
+        self.output_path = output_path
+        self.connections = connections
+        self.segment_size = segment_size
+        self.headers = dict(headers or {})
+        self.report = report
+        self.cancel_event = cancel_event
+        self.retries = retries
+        self.timeout = timeout
+        self.governor = governor
+        self.priority = priority
+        self.part_path = f"{output_path}.segments.part"
+        self.state_path = f"{output_path}.segments.json"
+        self._lock = threading.Lock()
+
+    def run(self):
+        final_url, size, validator = probe(self.url, self.headers, self.timeout)
+        segments = self._load_state(size, validator)
+        if segments is None:
+            segments = [{'start': s, 'end': e, 'done': 0} for s, e in split_ranges(size, self.segment_size)]
+            with open(self.part_path, 'wb') as f:
+                f.truncate(size)
+        self.size, self.validator, self.segments = size, validator, segments
+        self._save_state()
+        self._downloaded = sum(s['done'] for s in segments)
+        self._started = time.monotonic()
+        self._resumed = self._downloaded
+        self._last_save = self._started
+
+        pending = queue.Queue()
+        for seg in segments:
+            if seg['done'] < seg['end'] - seg['start'] + 1:
+                pending.put(seg)
+        errors = []
+        workers = [threading.Thread(target=self._worker, args=(final_url, pending, errors), daemon=True)
+                   for _ in range(min(self.connections, pending.qsize()))]
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        self._save_state()
+        if errors:
+            raise errors[0]
+        self._verify()
+        os.replace(self.part_path, self.output_path)
+        os.remove(self.state_path)
+        self._report('finished')
+        return self.output_path
+
+    def _worker(self, url, pending, errors):
+        conn = _Connection(url, self.headers, self.timeout)
+        try:
+            while not errors:
+                try:
+                    seg = pending.get_nowait()
+                except queue.Empty:
+                    return
+                for attempt in range(self.retries):
+                    try:
+                        with self._slot():
+                            self._fetch(conn, seg)
+                        break
+                    except (OSError, http.client.HTTPException):
+                        conn.close()
+                        if attempt + 1 == self.retries:
+                            raise
+                        time.sleep(0.5 * 2 ** attempt)
+        except BaseException as e:
+            with self._lock:
+                errors.append(e)
+        finally:
+            conn.close()
+
+    def _slot(self):
+        if self.governor is None:
+            return nullcontext()
+        return self.governor.slot(self.priority)
+
+    def _fetch(self, conn, seg):
+        start = seg['start'] + seg['done']
+        resp = conn.get_range(start, seg['end'])
+        with open(self.part_path, 'r+b', buffering=0) as f:
+            f.seek(start)
+            while True:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    from yt_dlp.utils import DownloadCancelled
+
+                    raise DownloadCancelled("segmented download cancelled")
+                chunk = resp.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                f.write(chunk)
+                if self.governor is not None:
+                    self.governor.throttle(len(chunk))
+                with self._lock:
+                    seg['done'] += len(chunk)
+                    self._downloaded += len(chunk)
+                self._report('downloading')
+        if seg['done'] != seg['end'] - seg['start'] + 1:
+            raise http.client.IncompleteRead(b'', seg['end'] - seg['start'] + 1 - seg['done'])
+
+    def _verify(self):
+        missing = [s for s in self.segments if s['done'] != s['end'] - s['start'] + 1]
+        if missing or os.path.getsize(self.part_path) != self.size:
+            raise IOError(f"incomplete download: {len(missing)} segments missing in {self.part_path}")
+
+    def _report(self, status):
+        now = time.monotonic()
+        with self._lock:
+            downloaded = self._downloaded
+            if status == 'downloading' and now - self._last_save >= 1.0:
+                self._last_save = now
+                self._save_state()
+        if self.report is None:
+            return
+        elapsed = now - self._started
+        self.report({
+            'downloaded': downloaded,
+            'total': self.size,
+            'speed': (downloaded - self._resumed) / elapsed if elapsed > 0 else 0,
+            'percent': downloaded / self.size * 100 if self.size else 100.0,
+            'status': status,
+        })
+
+    def _load_state(self, size, validator):
+        if not (os.path.exists(self.state_path) and os.path.exists(self.part_path)):
+            return None
+        try:
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if state.get('size') != size or state.get('validator') != validator:
+            return None
+        return state['segments']
+
+    def _save_state(self):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'size': self.size, 'validator': self.validator,
+                       'segments': self.segments}, f)
+        os.replace(tmp, self.state_path)
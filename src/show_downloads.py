@@ -1,43 +1,121 @@
+import io
 import os
+from src.catalog import get_catalog
+from src.transcript_store import EXPORT_FORMATS, export, get_transcript_store
 
-def load_media_files(directory, extensions):
-    files = [f for f in os.listdir(directory) if any(f.lower().endswith(ext) for ext in extensions)]
-    return files
+PAGE_SIZE = 50
+GRID_COLUMNS = 4
+
+def media_source(media_server, name, directory, filename):
+    # Hand the player a URL (range requests, no bytes in this process) when a
+    # media server is running, otherwise the plain path.
+    if media_server is not None:
+        return media_server.url_for(name, filename)
+    return os.path.join(directory, filename)
+
+def format_entry(row):
+    parts = [row.get('title') or row['filename']]
+    if row.get('duration'):
+        minutes, seconds = divmod(int(row['duration']), 60)
+        parts.append(f"{minutes}:{seconds:02d}")
+    if row.get('size') and row['kind'] != "transcript":
+        parts.append(f"{row['size'] / (1024*1024):.1f} MB")
+    parts.append(row['ext'].lstrip('.'))
+    return " · ".join(parts)
+
+def preview_source(media_server, previews, path):
+    if media_server is not None and "previews" in media_server.roots:
+        return media_server.url_for("previews", os.path.relpath(path, previews.root))
+    return path
+
+def show_preview_grid(st, previews, rows):
+    # Posters of the current page; missing ones are queued in the background
+    # and show up on a later rerun
+    columns = st.columns(GRID_COLUMNS)
+    for i, row in enumerate(rows):
+        found = previews.get(row)
+        if 'poster' not in found:
+            previews.submit(row)
+        with columns[i % GRID_COLUMNS]:
+            if 'poster' in found:
+                st.image(found['poster'], caption=format_entry(row))
+            else:
+                st.caption(f"{format_entry(row)} (preview pending)")
+
+def show_transcript_export(st, store, video_id, name):
+    # Captions with timings, for the whole video or a time window
+    cues = store.open(video_id)
+    if cues is None:
+        return
+    with cues:
+        fcol, scol, ecol = st.columns(3)
+        with fcol:
+            fmt = st.selectbox("Export as", [f for f in EXPORT_FORMATS if f != "md"],
+                               key="transcript_export_format")
+        with scol:
+            start = st.number_input("From (s)", min_value=0.0, value=0.0, key="transcript_export_start")
+        with ecol:
+            end = st.number_input("To (s, 0 = end)", min_value=0.0, value=0.0, key="transcript_export_end")
+        out = io.StringIO()
+        export(cues, fmt, out, start or None, end or None)
+    st.download_button(f"Download {fmt.upper()}", out.getvalue(), file_name=f"{name}.{fmt}")
+
+def select_entry(st, catalog, kind, directory, label, grid=None):
+    # Filter/sort/page controls over the catalog, returns the chosen row or None;
+    # grid(rows) is drawn above the selector
+    catalog.reconcile(directory, kind)
+    fcol, scol, pcol = st.columns([3, 2, 1])
+    with fcol:
+        search = st.text_input("Filter", "", key=f"{kind}_filter")
+    with scol:
+        sort = st.selectbox("Sort by", ["added", "title", "size", "duration"], key=f"{kind}_sort")
+    total = catalog.count(kind, search or None, directory=directory)
+    pages = max((total + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    with pcol:
+        page = st.number_input("Page", min_value=1, max_value=pages, value=1, key=f"{kind}_page")
+    rows = catalog.query(kind, search or None, sort=sort, descending=sort in ("added", "size", "duration"),
+                         limit=PAGE_SIZE, offset=(page - 1) * PAGE_SIZE, directory=directory)
+    if not rows:
+        return None
+    if grid is not None:
+        grid(rows)
+    return st.selectbox(label, rows, format_func=format_entry, key=f"{kind}_select")
+
+def show_downloads(st, VIDEO_DIR, AUDIO_DIR, TRANSCRIPT_DIR, media_server=None, catalog=None,
+                   previews=None):
+    catalog = catalog if catalog is not None else get_catalog()
 
-def show_downloads(st, VIDEO_DIR, AUDIO_DIR, TRANSCRIPT_DIR):
     st.header("Downloaded Video Files")
-    video_files = load_media_files(VIDEO_DIR, [".mp4", ".webm", ".mkv"])
-    if video_files:
-        selected_video = st.selectbox("Select video to play", video_files, key="video_select")
-        if selected_video:
-            video_path = os.path.join(VIDEO_DIR, selected_video)
-            with open(video_path, "rb") as video_file:
-                video_bytes = video_file.read()
-            st.video(video_bytes)
+    grid = (lambda rows: show_preview_grid(st, previews, rows)) if previews is not None else None
+    selected_video = select_entry(st, catalog, "video", VIDEO_DIR, "Select video to play", grid=grid)
+    if selected_video:
+        found = previews.get(selected_video) if previews is not None else {}
+        # The small proxy plays at once; the original is only loaded on request
+        if 'proxy' in found and not st.checkbox("Play original", key="video_original"):
+            st.video(preview_source(media_server, previews, found['proxy']))
+        else:
+            st.video(media_source(media_server, "video", VIDEO_DIR, selected_video['filename']))
+        if 'sprite' in found:
+            st.image(found['sprite'], caption="Scenes")
     else:
         st.info("No video files downloaded yet.")
 
     st.header("Downloaded Audio Files")
-    audio_files = load_media_files(AUDIO_DIR, [".mp3", ".m4a", ".aac", ".wav"])
-    if audio_files:
-        selected_audio = st.selectbox("Select audio to play", audio_files, key="audio_select")
-        if selected_audio:
-            audio_path = os.path.join(AUDIO_DIR, selected_audio)
-            with open(audio_path, "rb") as audio_file:
-                audio_bytes = audio_file.read()
-            st.audio(audio_bytes)
+    selected_audio = select_entry(st, catalog, "audio", AUDIO_DIR, "Select audio to play")
+    if selected_audio:
+        st.audio(media_source(media_server, "audio", AUDIO_DIR, selected_audio['filename']))
     else:
         st.info("No audio files downloaded yet.")
 
     st.header("Available Transcript Files")
-    transcript_files = load_media_files(TRANSCRIPT_DIR, [".md", ".txt"])
-    if transcript_files:
-        selected_transcript = st.selectbox("Select transcript to view", transcript_files, key="transcript_select")
-        if selected_transcript:
-            transcript_path = os.path.join(TRANSCRIPT_DIR, selected_transcript)
-            with open(transcript_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            st.markdown(f"### Transcript: {selected_transcript}")
-            st.markdown(content)
+    selected_transcript = select_entry(st, catalog, "transcript", TRANSCRIPT_DIR, "Select transcript to view")
+    if selected_transcript:
+        with open(selected_transcript['path'], "r", encoding="utf-8") as f:
+            content = f.read()
+        st.markdown(f"### Transcript: {selected_transcript['title'] or selected_transcript['filename']}")
+        if selected_transcript.get('video_id'):
+            show_transcript_export(st, get_transcript_store(), selected_transcript['video_id'],
+                                   os.path.splitext(selected_transcript['filename'])[0])
+        st.markdown(content)
     else:
         st.info("No transcript files available.")
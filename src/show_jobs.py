@@ -0,0 +1,48 @@
+KIND_LABELS = {"video": "Video + Audio", "audio": "Audio", "transcript": "Transcript"}
+
+
+def job_status_text(job):
+    progress = job.get('progress')
+    if job['state'] == 'running' and progress:
+        speed = progress.get('speed_avg')
+        if speed is None:
+            speed = progress.get('speed') or 0
+        eta = f", {int(progress['eta'])} s left" if progress.get('eta') is not None else ""
+        return (f"{progress['stage'].capitalize()} downloading: "
+                f"{progress.get('downloaded', 0) / 1024 / 1024:.2f} / "
+                f"{progress.get('total', 0) / 1024 / 1024:.2f} MB "
+                f"({progress.get('percent', 0):.1f}%) @ {speed / 1024:.1f} KiB/s{eta}")
+    if job['state'] == 'done':
+        return f"Saved: {job['result']}"
+    if job['state'] == 'queued' and job['error']:
+        return f"Retrying after error: {job['error']}"
+    if job['error']:
+        return f"Error: {job['error']}"
+    return job['state'].capitalize()
+
+
+def show_jobs(st, service, job_ids):
+    """
+    Renders the session's jobs from the job service. Only reads job state,
+    so it is cheap to rerun every second while something is active.
+    Returns True while any of the jobs is queued or running.
+    """
+    jobs = service.list(set(job_ids))
+    if not jobs:
+        return False
+    st.subheader("Jobs")
+    for job in sorted(jobs, key=lambda j: job_ids.index(j['id']), reverse=True):
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.text(f"{KIND_LABELS.get(job['kind'], job['kind'])} - {job['url']}")
+            progress = job.get('progress') or {}
+            if job['state'] == 'done':
+                st.progress(100)
+            elif job['state'] == 'running':
+                st.progress(min(int(progress.get('percent', 0)), 100))
+            st.caption(job_status_text(job))
+        with col2:
+            if job['state'] in ('queued', 'running') and not job.get('cancel_requested'):
+                if st.button("Cancel", key=f"cancel_{job['id']}"):
+                    service.cancel(job['id'])
+    return any(job['state'] in ('queued', 'running') for job in jobs)
@@ -0,0 +1,23 @@
+from src.transcript_search import get_search_index, youtube_link
+
+def format_time(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+def show_search(st, TRANSCRIPT_DIR, index=None):
+    index = index if index is not None else get_search_index()
+    st.header("Search Transcripts")
+    query = st.text_input("Search all transcripts", "", key="transcript_search")
+    if not query:
+        return
+    # Pick up transcripts that were saved before the index existed
+    index.index_markdown_dir(TRANSCRIPT_DIR)
+    hits = index.search(query, limit=20)
+    if not hits:
+        st.info("No matches.")
+        return
+    for hit in hits:
+        link = youtube_link(hit['video_id'], hit['start'])
+        at = f" @ {format_time(hit['start'])}" if hit['start'] is not None else ""
+        st.markdown(f"**[{hit['title'] or hit['video_id']}{at}]({link})**  \n{hit['snippet']}")
@@ -0,0 +1,250 @@
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from src.catalog import MEDIA_EXTENSIONS, get_catalog
+from src.media_store import get_media_store
+from src.metrics import get_metrics
+from src.transcript_search import get_search_index
+
+# Hidden in-progress names: `.Title.3f2a9c.writing.mp4` next to `Title.mp4`
+WRITING_MARKER = ".writing"
+# Leftovers of interrupted writes, by suffix, anywhere under the managed roots
+TEMP_SUFFIXES = (".link-tmp", ".tmp")
+# Partial downloads and their sidecars (in progress or resumable)
+PARTIAL_SUFFIXES = (".part", ".segments.part", ".segments.json", ".ytdl")
+# Resumable partial downloads (yt-dlp `.part`, segmented downloads) are kept
+# this long before they count as abandoned
+PARTIAL_MAX_AGE = 7 * 24 * 3600
+
+_SIZE_RE = re.compile(r'^\s*([\d.]+)\s*([kmgt]?)i?b?\s*$', re.IGNORECASE)
+
+
+def parse_size(text):
+    """'500M', '20G', '1.5t', '1048576' -> bytes; None/'' -> None."""
+    if text is None or text == '':
+        return None
+    m = _SIZE_RE.match(str(text))
+    if not m:
+        raise ValueError(f"bad size: {text!r}")
+    return int(float(m.group(1)) * 1024 ** " kmgt".index(m.group(2).lower() or " "))
+
+
+def writing_path(path):
+    """Hidden sibling of path (same directory and extension) to write into first."""
+    directory, name = os.path.split(path)
+    stem, ext = os.path.splitext(name)
+    return os.path.join(directory, f".{stem}.{uuid.uuid4().hex[:6]}{WRITING_MARKER}{ext}")
+
+
+@contextmanager
+def atomic_output(path):
+    """
+    Yields a temporary path to write the output to; it is renamed over path
+    when the block succeeds and removed when it raises, so readers (the
+    catalog, the media server) never see a half-written file.
+    """
+    tmp = writing_path(path)
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _is_orphan(name, age):
+    if WRITING_MARKER in name or name.endswith(TEMP_SUFFIXES):
+        return True
+    if name.endswith(PARTIAL_SUFFIXES) or ".part-Frag" in name:
+        return age > PARTIAL_MAX_AGE
+    return False
+
+
+class StorageManager:
+    """
+    Keeps the download folders and the stream store within their quotas.
+
+    Output folders are evicted least recently used first (last download or
+    last playback, as kept by the catalog); the store by file mtime, which
+    MediaStore refreshes on every reuse. Files are hardlinked between the
+    store and the folders, so the total is counted per inode and a folder
+    eviction only frees space once the store copy is gone too.
+
+    dirs: dict kind -> directory (video, audio, transcript, temp)
+    quotas: dict kind (or "store") -> max bytes; missing = unlimited
+    total: max bytes for everything together (None = unlimited)
+    store: MediaStore whose held streams are never evicted (default: the
+        shared one)
+    search_index / transcripts: where evicted transcripts are also dropped
+        from (default: the shared search index and transcript store)
+    previews: PreviewGenerator whose previews of evicted videos are removed
+        (default: the shared one)
+    grace: seconds a temp file must be untouched before reconcile() treats
+        it as orphaned (another process may still be writing it)
+    """
+
+    def __init__(self, dirs, quotas=None, total=None, store=None, catalog=None,
+                 search_index=None, transcripts=None, previews=None, grace=3600):
+        # Both import this module (atomic_output)
+        from src.previews import get_preview_generator
+        from src.transcript_store import get_transcript_store
+
+        self.dirs = dirs
+        self.quotas = dict(quotas or {})
+        self.total = total
+        self.store = store if store is not None else get_media_store()
+        self.store_dir = self.store.root
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.search_index = search_index if search_index is not None else get_search_index()
+        self.transcripts = transcripts if transcripts is not None else get_transcript_store()
+        self.previews = previews if previews is not None else get_preview_generator()
+        self.grace = grace
+        self._lock = threading.Lock()
+        self.evicted_files = 0
+        self.evicted_bytes = 0
+        self.reclaimed_bytes = 0
+
+    def reconcile(self):
+        """
+        Startup pass: removes orphaned temp files (in temp_dir, hidden
+        in-progress outputs, link temps, abandoned partial downloads) and
+        returns the bytes reclaimed.
+        """
+        now = time.time()
+        reclaimed = 0
+        candidates = []
+        temp_dir = self.dirs.get('temp')
+        if temp_dir and os.path.isdir(temp_dir):
+            candidates += [(os.path.join(temp_dir, n), True) for n in os.listdir(temp_dir)]
+        roots = [d for kind, d in self.dirs.items() if kind != 'temp'] + [self.store_dir]
+        for root in roots:
+            for directory, _, files in os.walk(root):
+                candidates += [(os.path.join(directory, n), False) for n in files]
+        for path, in_temp in candidates:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            age = now - st.st_mtime
+            if not os.path.isfile(path) or age < self.grace:
+                continue
+            if in_temp or _is_orphan(os.path.basename(path), age):
+                os.remove(path)
+                reclaimed += st.st_size
+        self.reclaimed_bytes += reclaimed
+        return reclaimed
+
+    def usage(self):
+        """Bytes per kind, for the store, and in total (hardlinks counted once)."""
+        usage = {}
+        inodes = {}
+        for kind, directory in self._roots():
+            used = 0
+            for path in self._files(directory, recursive=(kind == 'store')):
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                used += st.st_size
+                inodes[(st.st_dev, st.st_ino)] = st.st_size
+            usage[kind] = used
+        usage['total'] = sum(inodes.values())
+        return usage
+
+    def enforce(self, protect=()):
+        """
+        Evicts until every quota holds. Paths in protect (e.g. the file a
+        job just produced) are never removed. Returns the evicted paths.
+        """
+        protect = {os.path.abspath(p) for p in protect if p}
+        with self._lock:
+            usage = self.usage()
+            evicted = []
+            for kind, directory in self._roots():
+                limit = self.quotas.get(kind)
+                if limit is not None and usage[kind] > limit:
+                    evicted += self._evict(kind, directory, usage, lambda: usage[kind] > limit, protect)
+            if self.total is not None and usage['total'] > self.total:
+                # Store first: its streams are only a cache of the outputs
+                for kind, directory in sorted(self._roots(), key=lambda r: r[0] != 'store'):
+                    if usage['total'] <= self.total:
+                        break
+                    evicted += self._evict(kind, directory, usage,
+                                           lambda: usage['total'] > self.total, protect)
+            return evicted
+
+    def stats(self):
+        return {'evicted_files': self.evicted_files, 'evicted_bytes': self.evicted_bytes,
+                'reclaimed_bytes': self.reclaimed_bytes}
+
+    def _roots(self):
+        roots = [(kind, d) for kind, d in self.dirs.items() if kind in MEDIA_EXTENSIONS]
+        return roots + [('store', self.store_dir)]
+
+    @staticmethod
+    def _files(directory, recursive=False):
+        if not os.path.isdir(directory):
+            return []
+        if recursive:
+            return [os.path.join(d, n) for d, _, files in os.walk(directory) for n in files]
+        return [e.path for e in os.scandir(directory) if e.is_file()]
+
+    def _lru(self, kind, directory):
+        if kind == 'store':
+            # Never partial downloads, their sidecars, or streams a running
+            # job holds (still downloading, or waiting to be merged/linked)
+            held = self.store.held()
+            files = []
+            for path in self._files(directory, recursive=True):
+                name = os.path.basename(path)
+                if (WRITING_MARKER in name or name.endswith(TEMP_SUFFIXES + PARTIAL_SUFFIXES)
+                        or ".part-Frag" in name or name.endswith('.json')
+                        or os.path.abspath(path) in held):
+                    continue
+                try:
+                    files.append((os.path.getmtime(path), path, None))
+                except FileNotFoundError:
+                    continue
+            return [(path, video_id) for _, path, video_id in sorted(files)]
+        self.catalog.reconcile(directory, kind)
+        return [(path, video_id) for path, _, video_id in self.catalog.least_recently_used(directory)]
+
+    def _evict(self, kind, directory, usage, over, protect):
+        evicted = []
+        for path, video_id in self._lru(kind, directory):
+            if not over():
+                break
+            if os.path.abspath(path) in protect:
+                continue
+            try:
+                st = os.stat(path)
+                os.remove(path)
+            except OSError:
+                continue
+            usage[kind] -= st.st_size
+            if st.st_nlink == 1:
+                usage['total'] -= st.st_size
+            if kind != 'store':
+                self.catalog.remove(path)
+                if kind == 'transcript' and video_id:
+                    self.search_index.remove(video_id)
+                    self.transcripts.remove(video_id)
+                if kind == 'video':
+                    self.previews.remove(path, st.st_size, st.st_mtime)
+            self.evicted_files += 1
+            self.evicted_bytes += st.st_size
+            get_metrics().inc("ytscript_storage_evicted_bytes_total", st.st_size, kind=kind)
+            evicted.append(path)
+        return evicted
+
+
+def quotas_from_env(environ=os.environ):
+    """QUOTA_VIDEO, QUOTA_AUDIO, QUOTA_TRANSCRIPT, QUOTA_STORE, QUOTA_TOTAL (e.g. 50G)."""
+    quotas = {kind: parse_size(environ.get(f"QUOTA_{kind.upper()}"))
+              for kind in ('video', 'audio', 'transcript', 'store')}
+    return {k: v for k, v in quotas.items() if v is not None}, parse_size(environ.get("QUOTA_TOTAL"))
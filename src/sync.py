@@ -0,0 +1,176 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from src.catalog import get_catalog
+from src.metadata_cache import canonical_video_id
+from src.ydl_pool import get_ydl_pool
+
+ARCHIVE_PATH = "downloads/.cache/archive.sqlite3"
+
+# Feeds listed newest first, where enumeration can stop at the first run of
+# already archived entries (playlists are oldest first and are walked fully)
+_NEWEST_FIRST_RE = re.compile(r'youtube\.com/(@[^/]+|channel/[^/]+|c/[^/]+|user/[^/]+)(/(videos|streams|shorts))?/?$')
+STOP_AFTER_KNOWN = 50
+
+
+def newest_first(url):
+    return bool(_NEWEST_FIRST_RE.search(url.split('?')[0]))
+
+
+def iter_entries(url):
+    """
+    Yields (video_id, url) for every video of a playlist or channel without
+    resolving the entries: yt-dlp pages through the listing lazily, so
+    stopping the iteration early stops the page requests too.
+    """
+    with get_ydl_pool().acquire({'quiet': True, 'no_warnings': True, 'lazy_playlist': True,
+                                 'extract_flat': 'in_playlist'}) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        yield from _walk(ydl, info, depth=0)
+
+
+def _walk(ydl, info, depth):
+    if info.get('_type') not in ('playlist', 'multi_video'):
+        video_id = info.get('id') or canonical_video_id(info.get('url') or '')
+        if video_id:
+            yield video_id, f"https://www.youtube.com/watch?v={video_id}"
+        return
+    for entry in info.get('entries') or []:
+        if not entry:
+            continue
+        video_id = canonical_video_id(entry.get('url') or '') or (
+            entry.get('id') if entry.get('ie_key') == 'Youtube' else None)
+        if video_id:
+            yield video_id, f"https://www.youtube.com/watch?v={video_id}"
+        elif entry.get('entries') is not None:
+            yield from _walk(ydl, entry, depth)
+        elif entry.get('url') and depth < 2:
+            # Channel pages list their tabs (Videos, Shorts, ...) as playlists
+            yield from _walk(ydl, ydl.extract_info(entry['url'], download=False, process=False),
+                             depth + 1)
+
+
+class SyncArchive:
+    """
+    Record of what has been fetched for which video: one row per
+    (video id, kind) with the produced file and the chosen format, plus the
+    last sync time of every mirrored source. Rows are added as jobs finish,
+    and files already in the catalog are imported, so a sync only queues
+    videos that are missing an artifact.
+    """
+
+    def __init__(self, path=ARCHIVE_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS archive ("
+            " video_id TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " path TEXT,"
+            " format TEXT,"
+            " source TEXT,"
+            " added REAL NOT NULL,"
+            " PRIMARY KEY (video_id, kind));"
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " url TEXT PRIMARY KEY,"
+            " last_sync REAL NOT NULL,"
+            " entries INTEGER NOT NULL,"
+            " queued INTEGER NOT NULL);"
+        )
+        self._db.commit()
+
+    def record(self, video_id, kind, path=None, fmt=None, source=None):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO archive (video_id, kind, path, format, source, added)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (video_id, kind, path, fmt, source, time.time()),
+            )
+            self._db.commit()
+
+    def has(self, video_id, kind):
+        with self._lock:
+            return self._db.execute(
+                "SELECT 1 FROM archive WHERE video_id = ? AND kind = ?", (video_id, kind)
+            ).fetchone() is not None
+
+    def import_catalog(self, catalog=None):
+        """Adds files the catalog already knows (downloaded before syncing)."""
+        catalog = catalog if catalog is not None else get_catalog()
+        rows = [(video_id, kind, path, fmt, time.time())
+                for video_id, kind, path, fmt in catalog.artifacts() if os.path.exists(path)]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO archive (video_id, kind, path, format, added)"
+                " VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+        return len(rows)
+
+    def mark_synced(self, url, entries, queued):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sources (url, last_sync, entries, queued) VALUES (?, ?, ?, ?)",
+                (url, time.time(), entries, queued))
+            self._db.commit()
+
+    def count(self, kind=None):
+        with self._lock:
+            if kind is None:
+                return self._db.execute("SELECT COUNT(*) FROM archive").fetchone()[0]
+            return self._db.execute(
+                "SELECT COUNT(*) FROM archive WHERE kind = ?", (kind,)).fetchone()[0]
+
+
+def plan_sync(url, kinds, archive, stop_after_known=None, entries=None):
+    """
+    Returns [(kind, video url)] for the artifacts missing from the archive.
+
+    entries: iterable of (video_id, url) to use instead of listing url
+    stop_after_known: stop enumerating after this many consecutive videos
+    that already have every kind (default: STOP_AFTER_KNOWN for channels,
+    which list newest first, and no early stop for playlists)
+    """
+    if stop_after_known is None and newest_first(url):
+        stop_after_known = STOP_AFTER_KNOWN
+    todo = []
+    known_run = listed = 0
+    seen = set()
+    listing = iter_entries(url) if entries is None else iter(entries)
+    try:
+        for video_id, video_url in listing:
+            if video_id in seen:
+                continue
+            seen.add(video_id)
+            listed += 1
+            missing = [kind for kind in kinds if not archive.has(video_id, kind)]
+            if not missing:
+                known_run += 1
+                if stop_after_known and known_run >= stop_after_known:
+                    break
+                continue
+            known_run = 0
+            todo += [(kind, video_url) for kind in missing]
+    finally:
+        if hasattr(listing, 'close'):
+            listing.close()  # no further page requests
+    archive.mark_synced(url, listed, len(todo))
+    return todo
+
+
+def record_job(archive, job, catalog=None):
+    """JobQueue on_update hook: archives finished jobs."""
+    if job['state'] != 'done':
+        return
+    video_id = canonical_video_id(job['url'])
+    if not video_id:
+        return
+    catalog = catalog if catalog is not None else get_catalog()
+    row = catalog.get(job['result']) if job['result'] else None
+    archive.record(video_id, job['kind'], job['result'], row['format'] if row else None,
+                   source=job.get('options', {}).get('source'))
@@ -1,31 +1,102 @@
 import sys
 import re
-from youtube_transcript_api import YouTubeTranscriptApi
-from yt_dlp import YoutubeDL
+from src.catalog import get_catalog
+from src.governor import BATCH, get_governor
+from src.metadata_cache import extract_info
+from src.metrics import instrument
+from src.storage import atomic_output
+from src.transcript_search import get_search_index
+from src.transcript_store import get_transcript_store
 import os
 
+PARAGRAPH_END = ('.', '?', '!')
+
+def iter_paragraphs(segments, min_length=400):
+    """
+    Groups caption segments into paragraphs in a single linear pass.
+    segments: dicts with text/start/duration (as returned by the transcript
+    api) or plain caption strings
+    yields: dicts with text, start and end (seconds, None for plain strings)
+    """
+    parts = []
+    count = 0
+    start = end = None
+    for segment in segments:
+        if isinstance(segment, str):
+            line, seg_start, seg_end = segment, None, None
+        else:
+            line = segment['text']
+            seg_start = segment.get('start')
+            seg_end = seg_start + (segment.get('duration') or 0) if seg_start is not None else None
+        if not parts:
+            start = seg_start
+        parts.append(line)
+        end = seg_end
+        count += len(line) + 1  # Add 1 for the joining space
+        if line.strip().endswith(PARAGRAPH_END) and count >= min_length:
+            yield {'text': ' '.join(parts).strip(), 'start': start, 'end': end}
+            parts = []
+            count = 0
+    if parts and ''.join(parts):
+        yield {'text': ' '.join(parts).strip(), 'start': start, 'end': end}
+
+def render_markdown(video_id, title, description, paragraphs):
+    """Markdown document (YAML front matter + paragraphs) as one string."""
+    escaped_title = title.replace('"', '\\"')
+    out = [
+        "---\n",
+        f"video: https://www.youtube.com/watch?v={video_id}\n",
+        f"title: \"{escaped_title}\"\n",
+        "description: |\n",
+    ]
+    out += [f"  {line}\n" for line in (description or '').splitlines()]
+    out.append("---\n\n")
+    out += [f"\n\n{paragraph}" for paragraph in paragraphs]
+    return ''.join(out)
+
 class YTTranscriptText:
-    def __init__(self, url:str, dir:str):
+    def __init__(self, url:str, dir:str, catalog=None, search_index=None, priority=BATCH, store=None):
         self.url:str = url
         self.dir = dir
+        self.priority = priority
+        self.catalog = catalog if catalog is not None else get_catalog()
+        self.search_index = search_index if search_index is not None else get_search_index()
+        self.store = store if store is not None else get_transcript_store()
+        self.duration = None
         self.video_id:str
         self.title:str
         self.description:str
         self.transcript:list[object] = []
         self.transcript_text:list[str] = []
         self.transcript_paragraphs:list[str] = []
+        self.paragraph_times:list[tuple] = []
 
 
     def get_metadata(self):
-        with YoutubeDL({'quiet': True, 'skip_download': True}) as ydl:
-            info_dict = ydl.extract_info(self.url, download=False)
-            self.video_id = info_dict.get('id')
-            self.title = info_dict.get('title', 'untitled')
-            self.description = info_dict.get('description', '')
+        info_dict = extract_info(self.url)
+        self.video_id = info_dict.get('id')
+        self.title = info_dict.get('title', 'untitled')
+        self.description = info_dict.get('description', '')
+        self.duration = info_dict.get('duration')
 
     def get_transcript(self):
+        # Stored before: copy the segments out and release the mapping at once
+        cues = self.store.open(self.video_id)
+        if cues is not None:
+            with cues:
+                self.transcript = list(cues)
+            self.transcript_text = [subtitle["text"] for subtitle in self.transcript]
+            return
+        # Imported here so the UI does not pay for it before the first transcript
+        from youtube_transcript_api import YouTubeTranscriptApi
+
         # getting subtitle from youtube: list[dict]
-        self.transcript = YouTubeTranscriptApi.get_transcript(self.video_id)
+        # (one governor slot, so bursts of transcripts cannot trigger 429s)
+        with get_governor().slot(self.priority):
+            self.transcript = YouTubeTranscriptApi.get_transcript(self.video_id)
+        # Keep the timings for exports and time range lookups
+        self.store.save(self.video_id, self.transcript, title=getattr(self, 'title', None),
+                        description=getattr(self, 'description', None))
         # get text from each dict and make list of that test: list[str]
         self.transcript_text = [subtitle["text"] for subtitle in self.transcript]
 
@@ -37,54 +108,60 @@ class YTTranscriptText:
     
     def list_to_paragraphs(self, min_length=400) -> list[str]:
         """
-        input: list[str] here str is a short video caption
-        output: list[str] here str is a paragraphs
+        input: self.transcript segments (or self.transcript_text captions)
+        output: list[str] here str is a paragraph; start/end times of each
+        paragraph are kept in self.paragraph_times
         """
-        current = ''
-        count = 0
-        for line in self.transcript_text:
-            # Always add a space before new line content, unless starting out
-            if current:
-                current += ' '
-            current += line
-            count += len(line) + 1  # Add 1 for the space
-            if (line.strip().endswith(('.', '?', '!')) and count >= min_length):
-                self.transcript_paragraphs.append(current.strip())
-                current = ''
-                count = 0
-        if current:
-            self.transcript_paragraphs.append(current.strip())
-    
-    def write_markdown(self):
-        safe_title = self.sanitize_filename(self.title)
-        filepath = os.path.join(self.dir, f"{safe_title}.md")
-
-        # Write YAML front matter and transcript to file
-        with open(filepath, "w", encoding="utf-8") as f:
-            f.write("---\n")
-            f.write(f"video: https://www.youtube.com/watch?v={self.video_id}\n")
-            f.write(f"title: \"{self.title.replace('\"','\\\"')}\"\n")
-            f.write("description: |\n")
-            for line in self.description.splitlines():
-                f.write(f"  {line}\n")
-            f.write("---\n\n")
-            for paragraph in self.transcript_paragraphs:
-                f.write(f"\n\n{paragraph}")
-    
+        segments = self.transcript or self.transcript_text
+        self.transcript_paragraphs = []
+        self.paragraph_times = []
+        for paragraph in iter_paragraphs(segments, min_length):
+            self.transcript_paragraphs.append(paragraph['text'])
+            self.paragraph_times.append((paragraph['start'], paragraph['end']))
+        return self.transcript_paragraphs
+
+    def markdown_path(self):
+        return os.path.join(self.dir, f"{self.sanitize_filename(self.title)}.md")
+
+    def write_markdown(self, content=None):
+        """
+        Writes YAML front matter and transcript to file; content may be a
+        pre-rendered document (see render_markdown). Returns the file path.
+        """
+        filepath = self.markdown_path()
+        if content is None:
+            content = render_markdown(self.video_id, self.title, self.description,
+                                      self.transcript_paragraphs)
+        with atomic_output(filepath) as tmp_path, open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        self.catalog.record(filepath, "transcript", video_id=self.video_id,
+                            title=self.title, fmt="md", duration=self.duration)
+        # Index the timed segments (not the markdown) so hits keep their timestamps
+        self.search_index.add_transcript(self.video_id, self.title,
+                                         self.transcript or self.transcript_text, path=filepath)
+        return filepath
+
+    @instrument("transcript", output=lambda args, result: args['self'].markdown_path())
     def download(self):
         self.get_metadata()
         self.get_transcript()
         self.list_to_paragraphs()
-        self.write_markdown()
+        return self.write_markdown()
 
 def main():
     if len(sys.argv) < 2:
-        print(f"Usage: python {sys.argv[0]} <video_id>")
+        print(f"Usage: python {sys.argv[0]} <video_id> [<video_id> ...]")
         sys.exit(1)
 
-    url = sys.argv[1]
-    yt = YTTranscriptText(url, dir="download/transcript")
-    yt.download()
+    urls = sys.argv[1:]
+    if len(urls) == 1:
+        yt = YTTranscriptText(urls[0], dir="download/transcript")
+        yt.download()
+        return
+    from src.transcript_batch import download_transcripts
+    results = download_transcripts(urls, "download/transcript")
+    for url, result in results.items():
+        print(f"{url}: {result}")
 
 if __name__ == "__main__":
     main()
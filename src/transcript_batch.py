@@ -0,0 +1,87 @@
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from src.transcript import YTTranscriptText, iter_paragraphs, render_markdown
+
+
+def fetch_transcript(url, dir):
+    """Network half of YTTranscriptText.download: metadata + captions."""
+    yt = YTTranscriptText(url, dir)
+    yt.get_metadata()
+    yt.get_transcript()
+    return yt
+
+
+def format_transcript(video_id, title, description, segments, min_length=400):
+    """
+    CPU half: paragraphs (with timestamps) and the rendered markdown. Plain
+    arguments only, so it can run in a worker process.
+    """
+    paragraphs = list(iter_paragraphs(segments, min_length))
+    markdown = render_markdown(video_id, title, description, [p['text'] for p in paragraphs])
+    return markdown, paragraphs
+
+
+def _plain_segments(transcript):
+    return [
+        {'text': s['text'], 'start': s.get('start'), 'duration': s.get('duration')}
+        for s in transcript
+    ]
+
+
+def download_transcripts(urls, dir, fetch_workers=8, format_workers=0,
+                         min_length=400, on_result=None):
+    """
+    Saves transcripts for many videos at once. Fetches run on a thread pool
+    and each finished fetch is formatted on a process pool straight away, so
+    network and CPU work overlap; files are written as results come back.
+
+    format_workers: process count for formatting (None = cpu count). The
+        default 0 formats inline: a 10 hour transcript formats in a few ms,
+        less than it costs to pickle it to a worker (see
+        benchmarks/bench_transcript.py); raise it for very large batches of
+        huge transcripts on many-core machines.
+    on_result: function(url, path_or_exception) for each finished video
+    returns: dict url -> markdown path or the exception that stopped it
+    """
+    os.makedirs(dir, exist_ok=True)
+    results = {}
+
+    def finish(url, result):
+        results[url] = result
+        if on_result:
+            on_result(url, result)
+
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_workers)
+    format_pool = ProcessPoolExecutor(max_workers=format_workers) if format_workers != 0 else None
+    try:
+        pending = {fetch_pool.submit(fetch_transcript, url, dir): ('fetch', url, None)
+                   for url in dict.fromkeys(urls)}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                step, url, yt = pending.pop(fut)
+                try:
+                    result = fut.result()
+                    if step == 'fetch':
+                        yt = result
+                        args = (yt.video_id, yt.title, yt.description,
+                                _plain_segments(yt.transcript), min_length)
+                        if format_pool is not None:
+                            pending[format_pool.submit(format_transcript, *args)] = ('format', url, yt)
+                            continue
+                        result = format_transcript(*args)
+                    finish(url, _save(yt, *result))
+                except Exception as e:
+                    finish(url, e)
+    finally:
+        fetch_pool.shutdown(cancel_futures=True)
+        if format_pool is not None:
+            format_pool.shutdown(cancel_futures=True)
+    return results
+
+
+def _save(yt, markdown, paragraphs):
+    yt.transcript_paragraphs = [p['text'] for p in paragraphs]
+    yt.paragraph_times = [(p['start'], p['end']) for p in paragraphs]
+    return yt.write_markdown(markdown)
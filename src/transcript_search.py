@@ -0,0 +1,229 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+SEARCH_PATH = "downloads/.cache/search.sqlite3"
+# Seconds between two markdown backfill scans of the same directory
+RESCAN_INTERVAL = 60
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Words that match nearly every passage; dropping them from queries keeps
+# lookups to the selective terms (they are still indexed for snippets).
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he her his i in is it its "
+    "of on or our she so that the their them they this to was we were what "
+    "when which who will with you your".split()
+)
+
+
+def build_passages(segments, min_length=300):
+    """
+    Groups caption segments into passages (the unit that gets ranked).
+    Each passage keeps (start, char offset) for every segment in it, so a hit
+    can be mapped back to the exact caption it came from.
+    """
+    passages = []
+    parts, marks, length = [], [], 0
+    for segment in segments:
+        text = (segment['text'] if not isinstance(segment, str) else segment).strip()
+        if not text:
+            continue
+        start = segment.get('start') if not isinstance(segment, str) else None
+        if parts:
+            length += 1
+        marks.append((start, length))
+        parts.append(text)
+        length += len(text)
+        if length >= min_length:
+            passages.append((' '.join(parts), marks))
+            parts, marks, length = [], [], 0
+    if parts:
+        passages.append((' '.join(parts), marks))
+    return passages
+
+
+def query_terms(text):
+    tokens = _TOKEN_RE.findall(text.lower())
+    return [t for t in tokens if t not in STOPWORDS] or tokens
+
+
+def fts_query(text):
+    """
+    User text -> FTS5 query: every (non stop) word must appear; the last one
+    also matches as a prefix while the user is still typing it.
+    """
+    terms = query_terms(text)
+    if not terms:
+        return None
+    quoted = [f'"{t}"' for t in terms]
+    if len(terms[-1]) >= 4:
+        quoted[-1] += '*'
+    return ' '.join(quoted)
+
+
+def hit_time(passage_text, marks, terms):
+    """Start time of the first segment in the passage that mentions a term."""
+    lowered = passage_text.lower()
+    positions = [lowered.find(t) for t in terms]
+    positions = [p for p in positions if p >= 0]
+    first = min(positions) if positions else 0
+    start = marks[0][0] if marks else None
+    for seg_start, offset in marks:
+        if offset > first:
+            break
+        start = seg_start
+    return start
+
+
+class TranscriptIndex:
+    """
+    BM25 full text index over the transcript library, backed by SQLite FTS5.
+
+    Transcripts are split into passages of a few captions; each passage row
+    stores the segment start times so results link to the moment in the
+    video. Adding a transcript replaces whatever was indexed for that video,
+    so updates are incremental per video.
+    """
+
+    def __init__(self, path=SEARCH_PATH):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._scanned = {}
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            " video_id TEXT PRIMARY KEY,"
+            " title TEXT,"
+            " path TEXT,"
+            " mtime REAL,"
+            " indexed REAL);"
+            "CREATE VIRTUAL TABLE IF NOT EXISTS passages USING fts5("
+            " text, video_id UNINDEXED, start UNINDEXED, marks UNINDEXED,"
+            " tokenize = 'unicode61 remove_diacritics 2');"
+        )
+        self._db.commit()
+
+    def add_transcript(self, video_id, title, segments, path=None):
+        rows = [
+            (text, video_id, marks[0][0] if marks else None, json.dumps(marks))
+            for text, marks in build_passages(segments)
+        ]
+        path = os.path.abspath(path) if path else None
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        with self._lock:
+            self._db.execute("DELETE FROM passages WHERE video_id = ?", (video_id,))
+            self._db.executemany(
+                "INSERT INTO passages (text, video_id, start, marks) VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO transcripts (video_id, title, path, mtime, indexed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (video_id, title, path, mtime, time.time()),
+            )
+            self._db.commit()
+
+    def remove(self, video_id):
+        with self._lock:
+            self._db.execute("DELETE FROM passages WHERE video_id = ?", (video_id,))
+            self._db.execute("DELETE FROM transcripts WHERE video_id = ?", (video_id,))
+            self._db.commit()
+
+    def index_markdown_dir(self, directory, min_interval=RESCAN_INTERVAL):
+        """
+        Backfills transcripts written before the index existed (or edited
+        since) from their markdown files. Markdown has no timing, so these
+        hits carry no timestamp until the transcript is downloaded again.
+        Files are compared by mtime; a directory scanned less than
+        min_interval seconds ago is skipped (downloads index themselves).
+        """
+        directory = os.path.abspath(directory)
+        now = time.monotonic()
+        with self._lock:
+            last = self._scanned.get(directory)
+            if last is not None and now - last < min_interval:
+                return 0
+            self._scanned[directory] = now
+            known = {path: mtime for path, mtime in self._db.execute(
+                "SELECT path, mtime FROM transcripts WHERE path IS NOT NULL")}
+        added = 0
+        for name in os.listdir(directory):
+            if not name.endswith(".md"):
+                continue
+            path = os.path.abspath(os.path.join(directory, name))
+            if path in known and known[path] == os.path.getmtime(path):
+                continue
+            video_id, title, paragraphs = _read_markdown(path)
+            self.add_transcript(video_id or path, title or name[:-3],
+                                [{'text': p, 'start': None} for p in paragraphs], path=path)
+            added += 1
+        return added
+
+    def search(self, text, limit=20):
+        """
+        Returns up to `limit` hits, best first: dicts with video_id, title,
+        start (seconds or None), snippet and score (lower is better, BM25).
+        """
+        query = fts_query(text)
+        if query is None:
+            return []
+        terms = query_terms(text)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT p.video_id, t.title, p.text, p.marks,"
+                " snippet(passages, 0, '**', '**', '…', 16), bm25(passages)"
+                " FROM passages p LEFT JOIN transcripts t ON t.video_id = p.video_id"
+                " WHERE passages MATCH ? ORDER BY bm25(passages) LIMIT ?",
+                (query, limit),
+            ).fetchall()
+        return [
+            {
+                'video_id': video_id,
+                'title': title,
+                'start': hit_time(passage, json.loads(marks), terms),
+                'snippet': snippet,
+                'score': score,
+            }
+            for video_id, title, passage, marks, snippet, score in rows
+        ]
+
+
+def _read_markdown(path):
+    # Parses the front matter written by render_markdown
+    with open(path, "r", encoding="utf-8") as f:
+        content = f.read()
+    video_id = title = None
+    body = content
+    if content.startswith("---\n"):
+        end = content.find("\n---\n", 4)
+        if end != -1:
+            for line in content[4:end].splitlines():
+                if line.startswith("video:"):
+                    video_id = line.rsplit("v=", 1)[-1].strip()
+                elif line.startswith("title:"):
+                    title = line[6:].strip().strip('"').replace('\\"', '"')
+            body = content[end + 5:]
+    paragraphs = [p.strip() for p in body.split("\n\n") if p.strip()]
+    return video_id, title, paragraphs
+
+
+def youtube_link(video_id, start=None):
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    return f"{url}&t={int(start)}s" if start is not None else url
+
+
+_shared_index = None
+_shared_lock = threading.Lock()
+
+
+def get_search_index():
+    global _shared_index
+    with _shared_lock:
+        if _shared_index is None:
+            _shared_index = TranscriptIndex()
+        return _shared_index
@@ -0,0 +1,238 @@
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from src.storage import atomic_output
+
+CUES_DIR = "downloads/.cache/transcripts"
+MAGIC = b"YTCUES01"
+# magic, cue count, longest cue (ms), metadata bytes, text bytes
+_HEADER = struct.Struct("<8sIIII")
+
+
+def _column(buffer, offset, count):
+    """count little-endian uint32 values at offset, without copying where possible."""
+    view = memoryview(buffer)[offset:offset + 4 * count]
+    if sys.byteorder == "little":
+        return view.cast("I")
+    values = array("I", view)
+    values.byteswap()
+    return values
+
+
+class TranscriptCues:
+    """
+    Read-only view of one stored transcript, memory-mapped.
+
+    The file is a header, then three uint32 columns (start and duration in
+    milliseconds, UTF-8 offsets of every cue's text with one extra end
+    offset), a JSON metadata block (video_id, title, description) and the
+    concatenated text. Nothing is parsed up front: a cue is decoded when it
+    is read, and range() finds the cues of a time window by binary search
+    over the start column.
+
+    Indexing and iteration yield {'text', 'start', 'duration'} dicts (seconds),
+    so a TranscriptCues can stand in for the transcript api's segment list.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, self.max_duration, meta_size, text_size = _HEADER.unpack_from(self._map)
+        if magic != MAGIC:
+            self._map.close()
+            raise ValueError(f"not a transcript store file: {path}")
+        self.count = count
+        offset = _HEADER.size
+        self.starts = _column(self._map, offset, count)
+        self.durations = _column(self._map, offset + 4 * count, count)
+        self.offsets = _column(self._map, offset + 8 * count, count + 1)
+        meta_offset = offset + 4 * (3 * count + 1)
+        self.meta = json.loads(bytes(self._map[meta_offset:meta_offset + meta_size]) or b"{}")
+        self._text_offset = meta_offset + meta_size
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self.count
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return {'text': self.text(i), 'start': self.starts[i] / 1000,
+                'duration': self.durations[i] / 1000}
+
+    def __iter__(self):
+        return (self[i] for i in range(self.count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def text(self, i):
+        start = self._text_offset + self.offsets[i]
+        return self._map[start:self._text_offset + self.offsets[i + 1]].decode("utf-8")
+
+    def range(self, start=None, end=None):
+        """
+        Indices of the cues shown between start and end (seconds; None = open
+        ended): every cue that overlaps the window, in order.
+        """
+        lo_ms = 0 if start is None else int(start * 1000)
+        hi = self.count if end is None else bisect.bisect_left(self.starts, int(end * 1000))
+        # Cues starting up to max_duration before the window may still overlap it
+        lo = bisect.bisect_left(self.starts, lo_ms - self.max_duration, 0, hi)
+        return [i for i in range(lo, hi) if self.starts[i] + self.durations[i] > lo_ms
+                or self.starts[i] >= lo_ms]
+
+    def text_between(self, start=None, end=None):
+        return " ".join(self.text(i) for i in self.range(start, end))
+
+    def close(self):
+        # Views must be released before the map can close
+        for column in (self.starts, self.durations, self.offsets):
+            if isinstance(column, memoryview):
+                column.release()
+        self._map.close()
+
+
+def write_cues(path, segments, meta=None):
+    """Writes segments (dicts with text/start/duration, seconds) in the TranscriptCues layout."""
+    starts, durations, offsets = array("I"), array("I"), array("I", [0])
+    text = bytearray()
+    for segment in sorted(segments, key=lambda s: s.get('start') or 0):
+        starts.append(int(round((segment.get('start') or 0) * 1000)))
+        durations.append(int(round((segment.get('duration') or 0) * 1000)))
+        text += segment['text'].encode("utf-8")
+        offsets.append(len(text))
+    if sys.byteorder != "little":
+        for column in (starts, durations, offsets):
+            column.byteswap()
+    meta_bytes = json.dumps(meta or {}, ensure_ascii=False).encode("utf-8")
+    with atomic_output(path) as tmp_path, open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, len(starts), max(durations, default=0), len(meta_bytes), len(text)))
+        for column in (starts, durations, offsets):
+            f.write(column.tobytes())
+        f.write(meta_bytes)
+        f.write(text)
+    return path
+
+
+def _timestamp(seconds, separator):
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{ms:03d}"
+
+
+def iter_srt(cues, indices):
+    for n, i in enumerate(indices, 1):
+        start, duration = cues.starts[i] / 1000, cues.durations[i] / 1000
+        yield (f"{n}\n{_timestamp(start, ',')} --> {_timestamp(start + duration, ',')}\n"
+               f"{cues.text(i)}\n\n")
+
+
+def iter_vtt(cues, indices):
+    yield "WEBVTT\n\n"
+    for i in indices:
+        start, duration = cues.starts[i] / 1000, cues.durations[i] / 1000
+        yield f"{_timestamp(start, '.')} --> {_timestamp(start + duration, '.')}\n{cues.text(i)}\n\n"
+
+
+def iter_json(cues, indices):
+    yield "["
+    for n, i in enumerate(indices):
+        yield ("," if n else "") + json.dumps(cues[i], ensure_ascii=False)
+    yield "]\n"
+
+
+def iter_markdown(cues, indices, min_length=400):
+    from src.transcript import iter_paragraphs, render_markdown
+
+    meta = cues.meta
+    paragraphs = (p['text'] for p in iter_paragraphs((cues[i] for i in indices), min_length))
+    yield render_markdown(meta.get('video_id', ''), meta.get('title') or '',
+                          meta.get('description'), paragraphs)
+
+
+EXPORT_FORMATS = {'srt': iter_srt, 'vtt': iter_vtt, 'json': iter_json, 'md': iter_markdown}
+
+
+def export(cues, fmt, out, start=None, end=None):
+    """Streams the cues between start and end (seconds) to the text file out as fmt."""
+    for chunk in EXPORT_FORMATS[fmt](cues, cues.range(start, end)):
+        out.write(chunk)
+
+
+class TranscriptStore:
+    """
+    Timed transcripts, one TranscriptCues file per video id, so captions
+    for a time window or in another format never need a new fetch.
+    """
+
+    def __init__(self, root=CUES_DIR):
+        self.root = root
+
+    def path_for(self, video_id):
+        return os.path.join(self.root, f"{video_id}.cues")
+
+    def save(self, video_id, segments, title=None, description=None):
+        os.makedirs(self.root, exist_ok=True)
+        return write_cues(self.path_for(video_id), segments,
+                          {'video_id': video_id, 'title': title, 'description': description})
+
+    def has(self, video_id):
+        return os.path.exists(self.path_for(video_id))
+
+    def open(self, video_id):
+        """TranscriptCues for the video, or None if it was never stored."""
+        path = self.path_for(video_id)
+        return TranscriptCues(path) if os.path.exists(path) else None
+
+    def remove(self, video_id):
+        try:
+            os.remove(self.path_for(video_id))
+        except FileNotFoundError:
+            pass
+
+
+_shared_store = None
+_shared_lock = threading.Lock()
+
+
+def get_transcript_store():
+    global _shared_store
+    with _shared_lock:
+        if _shared_store is None:
+            _shared_store = TranscriptStore()
+        return _shared_store
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a stored transcript.")
+    parser.add_argument("video_id")
+    parser.add_argument("-f", "--format", choices=sorted(EXPORT_FORMATS), default="srt")
+    parser.add_argument("--start", type=float, help="from this many seconds in")
+    parser.add_argument("--end", type=float, help="up to this many seconds in")
+    args = parser.parse_args(argv)
+    cues = get_transcript_store().open(args.video_id)
+    if cues is None:
+        print(f"no stored transcript for {args.video_id}", file=sys.stderr)
+        return 1
+    with cues:
+        export(cues, args.format, sys.stdout, args.start, args.end)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+import json
+import threading
+from contextlib import contextmanager
+
+
+def options_key(opts):
+    """Hashable key for a YoutubeDL option set (callables compared by identity)."""
+    return json.dumps(opts, sort_keys=True, default=lambda v: f"<{type(v).__name__} {id(v)}>")
+
+
+class YDLPool:
+    """
+    Reusable `yt_dlp.YoutubeDL` instances keyed by option set.
+
+    Building a YoutubeDL (extractor registry, cookie jar, HTTP handlers) costs
+    tens of milliseconds and drops its open connections on close, so callers
+    check an instance out, use it, and hand it back for the next call with the
+    same options instead. An instance is only ever used by one thread at a
+    time; up to `max_idle` per option set are kept. yt_dlp itself is imported
+    on first use, not when this module is.
+
+    Per-call settings that would otherwise fragment the pool (format,
+    output template, progress hook) are passed to acquire() and applied to
+    the checked-out instance. An instance whose call raised is closed rather
+    than returned, since its state is unknown.
+    """
+
+    def __init__(self, max_idle=4):
+        self.max_idle = max_idle
+        self._idle = {}
+        self._lock = threading.Lock()
+        self.created = 0
+        self.reused = 0
+
+    @contextmanager
+    def acquire(self, opts=None, format=None, outtmpl=None, progress_hook=None):
+        """
+        opts: YoutubeDL options shared by every call of this kind (no
+            progress_hooks, format or outtmpl; pass those separately)
+        format: format selector for this call
+        outtmpl: output template (or plain path) for this call
+        progress_hook: function(d) for this call's downloads
+        """
+        opts = dict(opts or {})
+        key = options_key(opts)
+        with self._lock:
+            idle = self._idle.get(key)
+            entry = idle.pop() if idle else None
+            if entry is not None:
+                self.reused += 1
+        if entry is None:
+            entry = self._create(opts)
+        ydl = entry.ydl
+        if format is not None:
+            ydl.params['format'] = format
+            ydl.format_selector = ydl.build_format_selector(format)
+        if outtmpl is not None:
+            ydl.params['outtmpl'] = {'default': outtmpl}
+        entry.hook.target = progress_hook
+        try:
+            yield ydl
+        except BaseException:
+            ydl.close()
+            raise
+        entry.reset()
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(entry)
+                entry = None
+        if entry is not None:
+            ydl.close()
+
+    def _create(self, opts):
+        import yt_dlp
+
+        hook = _HookSlot()
+        entry = _Pooled(yt_dlp.YoutubeDL(dict(opts, progress_hooks=[hook])), hook)
+        with self._lock:
+            self.created += 1
+        return entry
+
+    def close(self):
+        with self._lock:
+            entries = [entry for idle in self._idle.values() for entry in idle]
+            self._idle.clear()
+        for entry in entries:
+            entry.ydl.close()
+
+    def stats(self):
+        with self._lock:
+            idle = sum(len(v) for v in self._idle.values())
+            return {'created': self.created, 'reused': self.reused, 'idle': idle}
+
+
+class _Pooled:
+    def __init__(self, ydl, hook):
+        self.ydl = ydl
+        self.hook = hook
+        self.defaults = (ydl.params.get('format'), ydl.format_selector, ydl.params.get('outtmpl'))
+
+    def reset(self):
+        """Undoes per-call settings so the next caller sees the pooled options."""
+        self.hook.target = None
+        fmt, selector, outtmpl = self.defaults
+        self.ydl.params['format'] = fmt
+        self.ydl.format_selector = selector
+        self.ydl.params['outtmpl'] = outtmpl
+
+
+class _HookSlot:
+    """Progress hook installed once per instance, forwarding to the current caller."""
+
+    def __init__(self):
+        self.target = None
+
+    def __call__(self, d):
+        if self.target is not None:
+            self.target(d)
+
+
+_shared_pool = None
+_shared_lock = threading.Lock()
+
+
+def get_ydl_pool():
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = YDLPool()
+        return _shared_pool
@@ -1,22 +1,60 @@
 import streamlit as st
 import os
-import threading
-import time
-from yt_dlp import YoutubeDL
-from src.transcript import YTTranscriptText
+from src.metadata_cache import extract_info, get_cache
 from src.video_info import show_video_info
 from src.show_downloads import show_downloads
+from src.show_search import show_search
+from src.show_jobs import show_jobs
+from src.media_server import get_media_server
+from src.metrics import serve_metrics
+from src.job_queue import combination_format
+from src.job_service import get_job_service
 from src.audio_video import AudioVideoDownloader
+from src.catalog import get_catalog
+from src.storage import StorageManager, quotas_from_env
+from src.previews import PREVIEW_DIR, get_preview_generator
 # --- Config (Change these paths as per your folders) ---
 VIDEO_DIR = "downloads/video"
 AUDIO_DIR = "downloads/audio"
 TRANSCRIPT_DIR = "downloads/transcript"
 TEMP_DIR = "downloads/.temp"
+# Local media server for playback (set MEDIA_PUBLIC_URL when the browser is not on this host)
+MEDIA_HOST = os.environ.get("MEDIA_HOST", "127.0.0.1")
+MEDIA_PORT = int(os.environ.get("MEDIA_PORT", "0"))
+MEDIA_PUBLIC_URL = os.environ.get("MEDIA_PUBLIC_URL")
+# Prometheus /metrics endpoint (off unless METRICS_PORT is set; METRICS_LOG adds a JSON-lines log)
+METRICS_PORT = os.environ.get("METRICS_PORT")
+# Background job service shared by all sessions (JOB_API_PORT also serves it as JSON over HTTP)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "2"))
+JOB_API_PORT = os.environ.get("JOB_API_PORT")
+JOB_POLL_SECONDS = 1
+# Parallel ranged HTTP connections per stream (1 = yt-dlp's single connection)
+DOWNLOAD_CONNECTIONS = int(os.environ.get("DOWNLOAD_CONNECTIONS", "1"))
+# Disk quotas (QUOTA_VIDEO, QUOTA_AUDIO, QUOTA_TRANSCRIPT, QUOTA_STORE, QUOTA_TOTAL, e.g. "50G")
+QUOTAS, QUOTA_TOTAL = quotas_from_env()
 
 # Create dirs if not exist
 for d in [AUDIO_DIR, VIDEO_DIR, TRANSCRIPT_DIR, TEMP_DIR]:
     os.makedirs(d, exist_ok=True)
 
+if METRICS_PORT:
+    serve_metrics(int(METRICS_PORT))
+
+DIRS = {'video': VIDEO_DIR, 'audio': AUDIO_DIR, 'transcript': TRANSCRIPT_DIR, 'temp': TEMP_DIR}
+job_service = get_job_service(
+    DIRS, workers=JOB_WORKERS, port=int(JOB_API_PORT) if JOB_API_PORT else None,
+    connections=DOWNLOAD_CONNECTIONS,
+    storage=StorageManager(DIRS, quotas=QUOTAS, total=QUOTA_TOTAL),
+    previews=get_preview_generator())
+if "job_ids" not in st.session_state:
+    st.session_state.job_ids = []
+
+
+def submit_job(kind, url, options=None):
+    job = job_service.submit(kind, url, options)
+    if job['id'] not in st.session_state.job_ids:
+        st.session_state.job_ids.append(job['id'])
+
 # --- UI layout ---
 st.title("YouTube Downloader & Transcript Viewer")
 st.markdown("A simple and easy-to-use YouTube downloader with transcript reading capabilities.")
@@ -25,20 +63,14 @@ st.markdown("A simple and easy-to-use YouTube downloader with transcript reading
 youtube_url = st.text_input("Enter YouTube URL", "")
 
 if youtube_url:
-    ydl_opts = {
-            'quiet': True,
-            'skip_download': True,
-        }
-
     info = None
 
-    with YoutubeDL(ydl_opts) as ydl:
-        # Extract video info
-        try:
-            info = ydl.extract_info(youtube_url, download=False)
-        except Exception as e:
-            st.error(f"Error fetching video info: {e}")
-            info = None
+    # Extract video info (cached across reruns, sessions and restarts)
+    try:
+        info = extract_info(youtube_url)
+    except Exception as e:
+        st.error(f"Error fetching video info: {e}")
+        info = None
 
     if info:
         show_video_info(st, info)
@@ -49,13 +81,17 @@ if youtube_url:
             audio_dir=AUDIO_DIR,
             info=info,
             audio_only=False,
-            temp_dir=TEMP_DIR
+            temp_dir=TEMP_DIR,
+            stream_merge=st.sidebar.checkbox(
+                "Stream merge (no temp files)", value=False,
+                help="Let ffmpeg read both streams directly instead of downloading to temp files first.")
         )
 
         # Prepare options and labels for user selection
         video_audio_combos = downloader.get_video_audio_combinations()
-        video_labels = [f"{combo.get('height') or 0}p {combo.get('ext_video')} - "
+        video_labels = [f"{combo.get('height') or 0}p {combo.get('container') or combo.get('ext_video')} - "
                         f"{combo.get('size') / (1024*1024):.2f} MB"
+                        + (f" (~{combo['seconds']:.0f} s)" if combo.get('seconds') else "")
                         for combo in video_audio_combos]
         
         audio_options = downloader.get_audio_options()
@@ -94,71 +130,54 @@ if youtube_url:
         with btn_col3:
             download_transcript_btn = st.button("Download Transcript")
 
-        # Placeholders for status/progress updates
-        status_placeholder = st.empty()
-        progress_placeholder = st.empty()
-
-        # Connect UI callbacks directly to the downloader callbacks
-        downloader.progress_hook = lambda stage, stats: progress_placeholder.progress(
-            int(stats.get('percent', 0))) or status_placeholder.text(
-                f"{stage.capitalize()} Downloading: "
-                f"{stats.get('downloaded', 0) / 1024 / 1024:.2f} / {stats.get('total', 0) / 1024 / 1024:.2f} MB "
-                f"({stats.get('percent', 0):.1f}%) @ {(stats.get('speed', 0) or 0) / 1024:.1f} KiB/s")
-
-        def status_cb(stage, status):
-            status_map = {
-                "downloading": f"{stage.capitalize()} Downloading...",
-                "completed": f"{stage.capitalize()} Download Complete.",
-                "merging": "Merging Audio and Video...",
-                "processing": "Post-processing...",
-            }
-            msg = status_map.get(status, f"{stage}: {status}")
-            status_placeholder.text(msg)
-            if status == "completed":
-                progress_placeholder.progress(100)
-        downloader.status_callback = status_cb
-
-        # Button triggers call class methods with selected options, minimal logic here
+        # Downloads run in the shared background job service; this session
+        # only submits them and keeps their ids to poll
         if download_video_btn:
             if video_choice_idx is not None and 0 <= video_choice_idx < len(video_audio_combos):
-                status_placeholder.text("Starting video + audio download...")
-                path = downloader.download_video_with_audio(video_audio_combos[video_choice_idx])
-                status_placeholder.success(f"Video+Audio downloaded: {path}")
-                progress_placeholder.progress(100)
+                combo = video_audio_combos[video_choice_idx]
+                submit_job("video", youtube_url, {
+                    'format': combination_format(combo),
+                    'stream_merge': downloader.stream_merge,
+                })
             else:
                 st.warning("Please select a valid video + audio option.")
 
         if download_audio_btn:
             if audio_choice_idx is not None and 0 <= audio_choice_idx < len(audio_options):
-                status_placeholder.text("Starting audio download...")
-                path = downloader.download_audio(audio_options[audio_choice_idx])
-                status_placeholder.success(f"Audio downloaded: {path}")
-                progress_placeholder.progress(100)
+                submit_job("audio", youtube_url, {'format': audio_options[audio_choice_idx]['format_id']})
             else:
                 st.warning("Please select a valid audio option.")
 
         if download_transcript_btn:
-            status_placeholder.text("Downloading transcript...")
-            progress_placeholder.progress(0)
+            submit_job("transcript", youtube_url)
 
-            yt_transcript = YTTranscriptText(youtube_url, TRANSCRIPT_DIR)
-            download_thread = threading.Thread(target=yt_transcript.download)
-            download_thread.start()
 
-            # Example fake-progress animation while the thread runs 
-            progress = 0
-            while download_thread.is_alive():
-                progress = (progress + 1) % 100
-                progress_placeholder.progress(progress)
-                time.sleep(0.3)
+def render_jobs():
+    if not show_jobs(st, job_service, st.session_state.job_ids) and jobs_active:
+        # Everything finished: one full rerun refreshes the download lists
+        st.rerun()
 
-            progress_placeholder.progress(100)
-            status_placeholder.text("Transcript downloaded successfully!")
 
+# Poll job state once a second while this session has work in flight
+jobs_active = any(job['state'] in ('queued', 'running')
+                  for job in job_service.list(set(st.session_state.job_ids)))
+if hasattr(st, "fragment"):
+    st.fragment(render_jobs, run_every=JOB_POLL_SECONDS if jobs_active else None)()
+else:
+    render_jobs()
 
-# Status and progress bar placeholders
-status_placeholder = st.empty()
-progress_placeholder = st.empty()
+cache_stats = get_cache().stats()
+st.sidebar.caption(
+    f"Metadata cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits / "
+    f"{cache_stats['misses']} misses ({cache_stats['hit_rate']:.0%})")
 
 # --- Show media lists from directories ---
-show_downloads(st, VIDEO_DIR, AUDIO_DIR, TRANSCRIPT_DIR)
\ No newline at end of file
+media_server = get_media_server(
+    {"video": VIDEO_DIR, "audio": AUDIO_DIR, "previews": PREVIEW_DIR}, MEDIA_HOST, MEDIA_PORT,
+    MEDIA_PUBLIC_URL)
+# Played files are evicted last; a played proxy counts for its original
+media_server.on_access = lambda path: get_catalog().touch(
+    get_preview_generator().source_of(path) or path)
+show_downloads(st, VIDEO_DIR, AUDIO_DIR, TRANSCRIPT_DIR, media_server=media_server,
+               previews=get_preview_generator())
+show_search(st, TRANSCRIPT_DIR)
\ No newline at end of file